@@ -0,0 +1,49 @@
+import threading
+import time
+
+from django.conf import settings
+
+from .models import User
+
+
+class UserCache:
+    """
+    Process-local cache of users keyed by id, with their role loaded.
+
+    Entries expire after ``ttl`` seconds and are dropped when the user is
+    saved or deleted in this process; other processes pick changes up once
+    their entries expire. Writes bypassing save() (queryset updates) are
+    only seen after expiry. Cached instances are shared, so never save them:
+    load a fresh copy to make changes.
+    """
+
+    def __init__(self, ttl=30):
+        self.ttl = ttl
+        self._entries = {}  # id -> (expires at, user or None)
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        """
+        Return the user with the given id, or None if there is none.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+
+        user = User.objects.select_related("user_role").filter(pk=user_id).first()
+        with self._lock:
+            self._entries[user_id] = (now + self.ttl, user)
+        return user
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache(ttl=getattr(settings, "USER_CACHE_TTL", 30))
@@ -0,0 +1,96 @@
+from accounts.cache import user_cache
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+
+class ClaimsRefreshToken(RefreshToken):
+    """
+    Refresh token carrying the user claims views need, copied into every
+    access token made from it.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token["email"] = user.email
+        token["role"] = user.user_role.role_name if user.user_role_id else None
+        token["is_staff"] = user.is_staff
+        return token
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = ClaimsRefreshToken
+
+
+class ClaimsUser(TokenUser):
+    """
+    Lightweight ``request.user`` built from the claims of a
+    ClaimsRefreshToken and the cached User.
+
+    Identity comes from the token, while ``is_staff``, ``is_superuser`` and
+    ``role`` come from ``user`` when given, so a demotion takes effect
+    within the user cache TTL rather than when the refresh token expires.
+    Compare and filter by ``pk``; use a fresh query when the User is written.
+    """
+
+    def __init__(self, token, user=None):
+        super().__init__(token)
+        self.user = user
+
+    @cached_property
+    def email(self):
+        return self.token.get("email", "")
+
+    @cached_property
+    def role(self):
+        if self.user is not None:
+            return self.user.user_role.role_name if self.user.user_role_id else None
+        return self.token.get("role")
+
+    @cached_property
+    def is_staff(self):
+        if self.user is not None:
+            return self.user.is_staff
+        return super().is_staff
+
+    @cached_property
+    def is_superuser(self):
+        if self.user is not None:
+            return self.user.is_superuser
+        return super().is_superuser
+
+    def __str__(self):
+        return self.email
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that takes the user from the token's claims.
+
+    The User itself comes from the short-TTL per-process user cache, so
+    deactivations and permission changes apply within USER_CACHE_TTL
+    seconds while most requests make no user query. Tokens issued without
+    the claims get the cached User as ``request.user``.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        user = user_cache.get(user_id)
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if "email" not in validated_token:
+            return user
+        return ClaimsUser(validated_token, user)
@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+import tempfile
+
+from bookings.pricing import price_appointments
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.template.loader import get_template, render_to_string
+
+from .pdf import INVOICE_STYLESHEET, pdf_renderer
+
+INVOICE_TEMPLATE = "invoices/appointment_invoice.html"
+
+# Seconds a client is told to wait while its invoice is rendered
+RENDER_RETRY_AFTER = 5
+
+
+class InvoiceStorage(FileSystemStorage):
+    """
+    Private storage for invoice PDFs under INVOICE_ROOT, outside MEDIA_ROOT
+    so they are only reachable through the authenticated download.
+
+    Names are content digests, so a file is written to a temporary name and
+    renamed into place: concurrent writers of the same invoice replace one
+    another atomically instead of creating suffixed duplicates.
+    """
+
+    def __init__(self):
+        super().__init__(location=settings.INVOICE_ROOT)
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def _save(self, name, content):
+        path = self.path(name)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as temp:
+                for chunk in content.chunks():
+                    temp.write(chunk)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return name
+
+
+def invoice_storage():
+    return InvoiceStorage()
+
+
+def invoice_context(appointment):
+    """
+    Template context of an appointment's invoice.
+
+    Lines, coupon and total all come from the appointment's price snapshot,
+    so the invoice bills what was charged even after catalog prices change.
+    """
+    price = price_appointments([appointment])[appointment.pk]
+    breakdown = price["breakdown"]
+    coupon = None
+    if breakdown["applied_coupon"]:
+        coupon = {
+            "code": breakdown["applied_coupon"],
+            "discount": breakdown["base_total"] - price["total_price"],
+        }
+    return {
+        "user": appointment.user,
+        "appointment": appointment,
+        "lines": breakdown["services"],
+        "total_price": price["total_price"],
+        "coupon": coupon,
+    }
+
+
+def _layout_version():
+    # Changing the template or its stylesheet changes every invoice
+    return [
+        hashlib.sha256(get_template(name).template.source.encode()).hexdigest()
+        for name in (INVOICE_TEMPLATE, INVOICE_STYLESHEET)
+    ]
+
+
+def invoice_digest(context):
+    """
+    SHA-256 of everything an invoice shows, so equal digests mean equal PDFs.
+    """
+    appointment = context["appointment"]
+    user = context["user"]
+    coupon = context["coupon"]
+    billing = {
+        "layout": _layout_version(),
+        "appointment": [appointment.pk, appointment.appointment_time],
+        "customer": [user.first_name, user.last_name, user.email],
+        "lines": [[line["name"], line["price"]] for line in context["lines"]],
+        "coupon": [coupon["code"], coupon["discount"]] if coupon else None,
+        "total_price": context["total_price"],
+    }
+    return hashlib.sha256(
+        json.dumps(billing, cls=DjangoJSONEncoder, sort_keys=True).encode()
+    ).hexdigest()
+
+
+def invoice_path(digest):
+    return f"{digest[:2]}/{digest}.pdf"
+
+
+def locate_invoice(appointment):
+    """
+    Return the storage name and digest an appointment's invoice has, or
+    would have once rendered.
+    """
+    digest = invoice_digest(invoice_context(appointment))
+    return invoice_path(digest), digest
+
+
+def stored_invoice(appointment):
+    """
+    Return the storage name and digest of an appointment's invoice PDF.
+
+    The PDF is rendered and stored only when no invoice with the same
+    content exists yet; unchanged invoices are served from storage. Renders
+    in this process, so call it from job workers rather than requests.
+    """
+    context = invoice_context(appointment)
+    digest = invoice_digest(context)
+    name = invoice_path(digest)
+    storage = invoice_storage()
+    if not storage.exists(name):
+        pdf = pdf_renderer().render(render_to_string(INVOICE_TEMPLATE, context))
+        storage.save(name, ContentFile(pdf))
+    return name, digest
@@ -0,0 +1,250 @@
+import logging
+import smtplib
+import threading
+import time
+
+from django.conf import settings
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.mail.backends.smtp import EmailBackend as SMTPBackend
+
+logger = logging.getLogger("api.mail")
+
+# Reply code of a server closing the transmission channel
+SERVICE_NOT_AVAILABLE = 421
+
+
+def is_connection_error(error):
+    """
+    Whether an error while sending means the connection is unusable, as
+    opposed to the message being rejected.
+    """
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code == SERVICE_NOT_AVAILABLE
+    # SMTPException subclasses OSError, so rule it out before socket errors
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+
+class PooledConnection:
+    """
+    An open, authenticated SMTP connection and how it has been used.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.sent = 0
+        self.last_used = time.monotonic()
+
+    def send(self, message):
+        # The backend is already open, so it keeps the connection afterwards
+        sent = self.backend.send_messages([message])
+        self.sent += 1
+        return sent
+
+    def close(self):
+        try:
+            self.backend.close()
+        except OSError:
+            pass
+
+
+class SMTPConnectionPool:
+    """
+    Authenticated SMTP connections shared by the threads of a process.
+
+    At most ``size`` connections are open at once; a caller waits up to
+    ``timeout`` seconds for one to be released. A connection is closed once
+    it has sent ``max_messages`` messages, and idle connections are not
+    reused after ``idle_timeout`` seconds, before the server drops them.
+    """
+
+    def __init__(self, connect, size=4, max_messages=100, idle_timeout=60, timeout=30):
+        self.connect = connect
+        self.size = size
+        self.max_messages = max_messages
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._idle = []
+        self._open = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """
+        Take an idle connection, or open a new one if the pool has room.
+
+        Raises:
+            SMTPException: If no connection was released within the timeout
+        """
+        deadline = time.monotonic() + self.timeout
+        stale = []
+        try:
+            with self._condition:
+                while True:
+                    while self._idle:
+                        connection = self._idle.pop()
+                        if time.monotonic() - connection.last_used < self.idle_timeout:
+                            return connection
+                        stale.append(connection)
+                        self._open -= 1
+                    if self._open < self.size:
+                        self._open += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise smtplib.SMTPException(
+                            f"All {self.size} SMTP connections are in use"
+                        )
+                    self._condition.wait(remaining)
+        finally:
+            for connection in stale:
+                connection.close()
+
+        try:
+            return PooledConnection(self.connect())
+        except BaseException:
+            with self._condition:
+                self._open -= 1
+                self._condition.notify()
+            raise
+
+    def release(self, connection, broken=False):
+        """
+        Return a connection to the pool, closing it instead if it is broken
+        or has reached its message limit.
+        """
+        if broken or connection.sent >= self.max_messages:
+            connection.close()
+            with self._condition:
+                self._open -= 1
+                self._condition.notify()
+            return
+
+        connection.last_used = time.monotonic()
+        with self._condition:
+            self._idle.append(connection)
+            self._condition.notify()
+
+    def close(self):
+        """
+        Close the idle connections. Connections in use are returned to the
+        pool when released.
+        """
+        with self._condition:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+            self._condition.notify_all()
+        for connection in idle:
+            connection.close()
+
+
+class PooledSender:
+    """
+    Sends messages one after the other over connections taken from a pool,
+    moving to a fresh connection when one reaches the pool's message limit
+    or turns out to be dropped.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.connection = None
+
+    def send(self, message):
+        while True:
+            if self.connection is None:
+                self.connection = self.pool.acquire()
+            connection = self.connection
+            try:
+                sent = connection.send(message)
+            except Exception as error:
+                if not is_connection_error(error):
+                    raise
+                self.pool.release(connection, broken=True)
+                self.connection = None
+                # A reused connection may have been dropped while idle, but
+                # a fresh one failing means the server is unreachable
+                if connection.sent == 0:
+                    raise
+                logger.info(f"SMTP connection lost ({error}), reconnecting")
+                continue
+
+            if connection.sent >= self.pool.max_messages:
+                self.pool.release(connection)
+                self.connection = None
+            return sent
+
+    def close(self):
+        if self.connection is not None:
+            self.pool.release(self.connection)
+            self.connection = None
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def connection_pool(**options):
+    """
+    Return this process's connection pool for the given SMTP options (as
+    taken by Django's SMTP backend), sized by the EMAIL_POOL_SIZE,
+    EMAIL_POOL_MAX_MESSAGES, EMAIL_POOL_IDLE_TIMEOUT and EMAIL_POOL_TIMEOUT
+    settings.
+    """
+    key = tuple(sorted(options.items()))
+    with _pools_lock:
+        if key not in _pools:
+
+            def connect():
+                backend = SMTPBackend(**options)
+                backend.open()
+                return backend
+
+            _pools[key] = SMTPConnectionPool(
+                connect,
+                size=getattr(settings, "EMAIL_POOL_SIZE", 4),
+                max_messages=getattr(settings, "EMAIL_POOL_MAX_MESSAGES", 100),
+                idle_timeout=getattr(settings, "EMAIL_POOL_IDLE_TIMEOUT", 60),
+                timeout=getattr(settings, "EMAIL_POOL_TIMEOUT", 30),
+            )
+        return _pools[key]
+
+
+def close_connection_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+class PooledEmailBackend(BaseEmailBackend):
+    """
+    SMTP email backend that keeps authenticated connections open between
+    sends, so consecutive emails skip the connect, TLS and login round
+    trips. A batch of messages goes over as few connections as the
+    per-connection message limit allows, and a connection the server
+    dropped is replaced transparently.
+
+    Takes the same options and EMAIL_* settings as Django's SMTP backend.
+    """
+
+    def __init__(self, fail_silently=False, **kwargs):
+        super().__init__(fail_silently=fail_silently)
+        self.options = kwargs
+
+    def send_messages(self, email_messages):
+        if not email_messages:
+            return 0
+
+        sender = PooledSender(connection_pool(**self.options))
+        num_sent = 0
+        try:
+            for message in email_messages:
+                try:
+                    num_sent += sender.send(message)
+                except OSError:
+                    if not self.fail_silently:
+                        raise
+        finally:
+            sender.close()
+        return num_sent
@@ -0,0 +1,107 @@
+from datetime import timedelta
+from decimal import Decimal
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from accounts.models import User
+from api.renderers import FastJSONRenderer, orjson
+from api.serializers import AppointmentSerializer
+from bookings.models import Appointment
+from services.models import Coupon, Service
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare FastJSONRenderer with DRF's JSONRenderer on appointment list "
+        "payloads and check that both produce the same bytes. Sample data is "
+        "rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--appointments",
+            type=int,
+            default=100,
+            help="Appointments in the rendered payload",
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=50, help="Runs per renderer (best is kept)"
+        )
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write(
+                self.style.WARNING(
+                    "orjson is not installed, FastJSONRenderer falls back to "
+                    "JSONRenderer"
+                )
+            )
+
+        with transaction.atomic():
+            payload = self.build_payload(options["appointments"])
+            transaction.set_rollback(True)
+
+        expected = JSONRenderer().render(payload)
+        if FastJSONRenderer().render(payload) != expected:
+            raise CommandError("FastJSONRenderer output differs from JSONRenderer")
+
+        self.stdout.write(
+            f"Output identical: {len(payload['data'])} appointments, "
+            f"{len(expected)} bytes"
+        )
+        baseline = self.best(options["repeat"], JSONRenderer(), payload)
+        fast = self.best(options["repeat"], FastJSONRenderer(), payload)
+        for name, seconds in (("JSONRenderer", baseline), ("FastJSONRenderer", fast)):
+            self.stdout.write(f"{name:>16}: {seconds * 1e3:8.3f} ms")
+        self.stdout.write(f"Speed-up: {baseline / fast:.1f}x")
+
+    def build_payload(self, count):
+        now = timezone.now()
+        user = User.objects.create_user(
+            email="renderer-benchmark@example.com", password=None
+        )
+        coupon = Coupon.objects.create(
+            coupon_code="RENDERBENCH",
+            discount=Decimal("15"),
+            valid_from=now - timedelta(days=1),
+            valid_until=now + timedelta(days=30),
+        )
+        services = [
+            Service.objects.create(
+                service_name=f"Benchmark service {i}",
+                description="Temporary service for benchmarking",
+                duration=30 + 15 * i,
+                price=Decimal("39.90") + 10 * i,
+                coupon=coupon if i % 2 else None,
+            )
+            for i in range(4)
+        ]
+        for i in range(count):
+            appointment = Appointment.objects.create(
+                user=user,
+                appointment_time=now + timedelta(days=i, hours=i % 8),
+                status="canceled",
+                coupon=coupon if i % 3 == 0 else None,
+            )
+            appointment.services.add(*services[: i % 4 + 1])
+
+        appointments = Appointment.objects.filter(user=user).for_listing()
+        # The same envelope api_response wraps around every payload
+        return {
+            "success": True,
+            "message": "Appointments retrieved successfully",
+            "data": AppointmentSerializer(appointments, many=True).data,
+            "status_code": 200,
+        }
+
+    def best(self, repeat, renderer, payload):
+        timings = []
+        for _ in range(repeat):
+            start = perf_counter()
+            renderer.render(payload)
+            timings.append(perf_counter() - start)
+        return min(timings)
@@ -0,0 +1,85 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from decimal import Decimal
+from time import perf_counter
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+
+from api.pdf import PDFRenderer, invoice_stylesheet
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure invoice PDFs per second rendered inline (as before the "
+        "renderer pool) and by PDFRenderer pools of several sizes. Uses "
+        "made-up invoices, no database access."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--invoices", type=int, default=48, help="Invoices rendered per run"
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            nargs="+",
+            default=[1, 4, 8],
+            help="Pool sizes to measure",
+        )
+
+    def handle(self, *args, **options):
+        documents = [self.invoice_html(i) for i in range(options["invoices"])]
+        stylesheet = invoice_stylesheet()
+
+        # Inline: a fresh document with its stylesheet embedded, per invoice
+        from weasyprint import HTML
+
+        inline = [
+            html.replace("</head>", f"<style>{stylesheet}</style></head>")
+            for html in documents
+        ]
+        start = perf_counter()
+        for html in inline:
+            HTML(string=html).write_pdf()
+        self.report("inline", len(inline), perf_counter() - start)
+
+        for workers in options["workers"]:
+            renderer = PDFRenderer([stylesheet], workers=workers)
+            try:
+                renderer.warm_up()
+                # Enough callers to keep every worker and the queue busy
+                with ThreadPoolExecutor(max_workers=renderer.max_pending) as callers:
+                    start = perf_counter()
+                    pdfs = list(callers.map(renderer.render, documents))
+                    elapsed = perf_counter() - start
+            finally:
+                renderer.shutdown()
+            assert all(pdf.startswith(b"%PDF") for pdf in pdfs)
+            self.report(f"{workers} workers", len(pdfs), elapsed)
+
+    def invoice_html(self, number):
+        lines = [
+            {"name": f"Benchmark service {i}", "price": Decimal("39.90") + 10 * i}
+            for i in range(number % 4 + 1)
+        ]
+        return render_to_string(
+            "invoices/appointment_invoice.html",
+            {
+                "user": SimpleNamespace(
+                    first_name="Bench", last_name="Mark", email="bench@example.com"
+                ),
+                "appointment": SimpleNamespace(
+                    id=number, appointment_time=datetime(2030, 1, 1, 10)
+                ),
+                "lines": lines,
+                "total_price": sum(line["price"] for line in lines),
+                "coupon": None,
+            },
+        )
+
+    def report(self, name, count, seconds):
+        self.stdout.write(
+            f"{name:>10}: {count / seconds:8.1f} PDFs/s ({seconds:.2f} s for {count})"
+        )
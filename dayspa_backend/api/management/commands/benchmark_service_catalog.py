@@ -0,0 +1,95 @@
+from decimal import Decimal
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+
+from api.serializers import ServiceSerializer, service_rows, service_values
+from services.models import Service
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the per-row cost of ServiceSerializer against the service_rows "
+        "fast path and check that both render the same bytes. Temporary "
+        "services are rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rows", type=int, default=500, help="Number of services to render"
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=20, help="Runs per path (best is kept)"
+        )
+
+    def handle(self, *args, **options):
+        rows = options["rows"]
+        with transaction.atomic():
+            self.ensure_services(rows)
+            self.run(rows, options["repeat"])
+            transaction.set_rollback(True)
+
+    def ensure_services(self, rows):
+        missing = rows - Service.objects.count()
+        if missing > 0:
+            Service.objects.bulk_create(
+                Service(
+                    service_name=f"Benchmark service {i}",
+                    description="Temporary service for benchmarking",
+                    duration=60,
+                    price=Decimal("49.90") + i,
+                    service_image=f"services/benchmark {i}.jpg" if i % 2 else None,
+                )
+                for i in range(missing)
+            )
+
+    def run(self, rows, repeat):
+        request = RequestFactory().get("/api/service/")
+        queryset = Service.objects.order_by("pk")[:rows]
+        instances = list(queryset)
+        values = list(service_values(queryset))
+
+        renderer = JSONRenderer()
+        expected = renderer.render(
+            ServiceSerializer(instances, many=True, context={"request": request}).data
+        )
+        if renderer.render(service_rows(values, request)) != expected:
+            raise CommandError("service_rows output differs from ServiceSerializer")
+
+        results = {
+            "serializer": self.best(
+                repeat,
+                lambda: ServiceSerializer(
+                    instances, many=True, context={"request": request}
+                ).data,
+            ),
+            "fast path": self.best(repeat, lambda: service_rows(values, request)),
+            "serializer + query": self.best(
+                repeat,
+                lambda: ServiceSerializer(
+                    queryset.all(), many=True, context={"request": request}
+                ).data,
+            ),
+            "fast path + query": self.best(
+                repeat,
+                lambda: service_rows(service_values(queryset), request),
+            ),
+        }
+
+        self.stdout.write(f"Output identical for {len(instances)} services")
+        for name, seconds in results.items():
+            self.stdout.write(
+                f"{name:>20}: {seconds * 1e3:8.2f} ms total, "
+                f"{seconds * 1e6 / len(instances):7.2f} us/row"
+            )
+
+    def best(self, repeat, func):
+        timings = []
+        for _ in range(repeat):
+            start = perf_counter()
+            func()
+            timings.append(perf_counter() - start)
+        return min(timings)
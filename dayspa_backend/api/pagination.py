@@ -0,0 +1,99 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.utils.urls import replace_query_param
+
+
+class AppointmentKeysetPagination(BasePagination):
+    """
+    Keyset pagination over (appointment_time, id).
+
+    The cursor holds the sort key of the last row served, so every page is
+    a range scan on the matching index however deep it is, with no OFFSET.
+    """
+
+    page_size = 20
+    max_page_size = 100
+    page_size_query_param = "page_size"
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    def __init__(self, descending=False):
+        self.descending = descending
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def encode_cursor(self, appointment):
+        position = [appointment.appointment_time.isoformat(), appointment.pk]
+        return urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            appointment_time, pk = json.loads(urlsafe_b64decode(cursor.encode()))
+            appointment_time = parse_datetime(appointment_time)
+            pk = int(pk)
+        except (BinasciiError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if appointment_time is None:
+            raise NotFound(self.invalid_cursor_message)
+        return appointment_time, pk
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+
+        if self.descending:
+            queryset = queryset.order_by("-appointment_time", "-id")
+        else:
+            queryset = queryset.order_by("appointment_time", "id")
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            appointment_time, pk = self.decode_cursor(cursor)
+            # The inclusive bound on appointment_time gives the index a range
+            # to seek to, the second condition skips rows already served
+            if self.descending:
+                queryset = queryset.filter(
+                    Q(appointment_time__lt=appointment_time)
+                    | Q(appointment_time=appointment_time, id__lt=pk),
+                    appointment_time__lte=appointment_time,
+                )
+            else:
+                queryset = queryset.filter(
+                    Q(appointment_time__gt=appointment_time)
+                    | Q(appointment_time=appointment_time, id__gt=pk),
+                    appointment_time__gte=appointment_time,
+                )
+
+        # One extra row tells whether there is a next page
+        page = list(queryset[: page_size + 1])
+        self.next_cursor = (
+            self.encode_cursor(page[page_size - 1]) if len(page) > page_size else None
+        )
+        return page[:page_size]
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.next_cursor,
+        )
+
+    def get_paginated_data(self, data):
+        return {
+            "results": data,
+            "next": self.get_next_link(),
+            "next_cursor": self.next_cursor,
+        }
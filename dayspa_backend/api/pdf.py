@@ -0,0 +1,188 @@
+import multiprocessing
+import signal
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.template.loader import get_template
+
+INVOICE_STYLESHEET = "invoices/appointment_invoice.css"
+
+# Grace period on top of the render timeout for the result to come back
+RESULT_GRACE = 5
+
+
+class PDFRenderError(Exception):
+    pass
+
+
+class PDFRenderTimeout(PDFRenderError):
+    pass
+
+
+class PDFRendererBusy(PDFRenderError):
+    pass
+
+
+# Per worker process state, set up once by _init_worker
+_stylesheets = None
+_font_config = None
+
+
+def _init_worker(css_texts):
+    """
+    Import WeasyPrint and parse the stylesheets once per worker process, then
+    render a small document so fonts are loaded before the first real job.
+    """
+    global _stylesheets, _font_config
+    from weasyprint import CSS, HTML
+    from weasyprint.text.fonts import FontConfiguration
+
+    _font_config = FontConfiguration()
+    _stylesheets = [CSS(string=text, font_config=_font_config) for text in css_texts]
+    HTML(string="<p>Warm-up</p>").write_pdf(
+        stylesheets=_stylesheets, font_config=_font_config
+    )
+
+
+def _on_timeout(signum, frame):
+    raise PDFRenderTimeout("PDF rendering timed out")
+
+
+def _render(html, timeout):
+    from weasyprint import HTML
+
+    # Stop a runaway document inside the worker, so the worker is freed too
+    previous = signal.signal(signal.SIGALRM, _on_timeout)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return HTML(string=html).write_pdf(
+            stylesheets=_stylesheets, font_config=_font_config
+        )
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+class PDFRenderer:
+    """
+    Renders HTML to PDF in a pool of worker processes that keep WeasyPrint,
+    the parsed stylesheets and the font cache loaded between documents.
+
+    At most ``max_pending`` documents are queued or rendering at once;
+    callers wait up to ``timeout`` seconds for a slot, then get
+    PDFRendererBusy. A document taking longer than ``timeout`` seconds is
+    aborted with PDFRenderTimeout. The pool starts on first use, and is
+    started again if a worker dies.
+    """
+
+    def __init__(self, css_texts, workers=2, max_pending=None, timeout=30):
+        self.css_texts = list(css_texts)
+        self.workers = workers
+        self.max_pending = max_pending or workers * 4
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    # Workers must not inherit the parent's threads and DB
+                    # connections
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.css_texts,),
+                )
+            return self._pool
+
+    def warm_up(self):
+        """
+        Start every worker now instead of on the first documents.
+        """
+        pool = self._get_pool()
+        futures = [
+            pool.submit(_render, "<p>Warm-up</p>", self.timeout)
+            for _ in range(self.workers)
+        ]
+        for future in futures:
+            future.result()
+
+    def render(self, html):
+        """
+        Render an HTML document to PDF bytes.
+
+        Raises:
+            PDFRendererBusy: If no slot freed up within the timeout
+            PDFRenderTimeout: If the document took too long to render
+        """
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PDFRendererBusy(f"{self.max_pending} PDFs are already pending")
+
+        pool = self._get_pool()
+        try:
+            future = pool.submit(_render, html, self.timeout)
+        except BrokenProcessPool:
+            self._slots.release()
+            self._discard(pool)
+            raise
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda future: self._slots.release())
+
+        try:
+            return future.result(timeout=self.timeout + RESULT_GRACE)
+        except FutureTimeoutError:
+            future.cancel()
+            raise PDFRenderTimeout("PDF rendering timed out")
+        except BrokenProcessPool:
+            self._discard(pool)
+            raise
+
+    def _discard(self, pool):
+        """
+        Shut down a broken pool so the next render starts a fresh one,
+        unless another thread already replaced it.
+        """
+        with self._lock:
+            if self._pool is not pool:
+                return
+            self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+
+_renderer = None
+_renderer_lock = threading.Lock()
+
+
+def invoice_stylesheet():
+    return get_template(INVOICE_STYLESHEET).render()
+
+
+def pdf_renderer():
+    """
+    Return this process's invoice PDF renderer, sized by the
+    PDF_RENDER_WORKERS, PDF_RENDER_MAX_PENDING and PDF_RENDER_TIMEOUT
+    settings.
+    """
+    global _renderer
+    with _renderer_lock:
+        if _renderer is None:
+            _renderer = PDFRenderer(
+                [invoice_stylesheet()],
+                workers=getattr(settings, "PDF_RENDER_WORKERS", 2),
+                max_pending=getattr(settings, "PDF_RENDER_MAX_PENDING", None),
+                timeout=getattr(settings, "PDF_RENDER_TIMEOUT", 30),
+            )
+        return _renderer
@@ -0,0 +1,47 @@
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, fall back to DRF's encoder
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSON renderer backed by orjson when it is installed.
+
+    Output matches DRF's JSONRenderer with its default settings: compact,
+    UTF-8, UTC datetimes ending in "Z", Decimals as numbers and U+2028/U+2029
+    escaped. datetime, date, time and UUID values are encoded natively;
+    everything else orjson does not know goes through DRF's encoder. Indented
+    output, non-default JSON settings, data orjson cannot encode (such as
+    integers beyond 64 bits) and installs without orjson are rendered by
+    JSONRenderer itself.
+
+    Enable it globally through DEFAULT_RENDERER_CLASSES or per view with
+    ``renderer_classes``.
+    """
+
+    options = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS if orjson else 0
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if (
+            orjson is None
+            or self.get_indent(accepted_media_type, renderer_context or {})
+            or not self.compact
+            or self.ensure_ascii
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        encoder = self.encoder_class()
+        try:
+            ret = orjson.dumps(data, default=encoder.default, option=self.options)
+        except TypeError:
+            # orjson rejects integers beyond 64 bits, which json encodes
+            return super().render(data, accepted_media_type, renderer_context)
+        # Match JSONRenderer, which escapes these for embedding in <script>
+        return ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+            b"\xe2\x80\xa9", b"\\u2029"
+        )
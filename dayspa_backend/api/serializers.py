@@ -1,14 +1,48 @@
 from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
+from rest_framework.settings import api_settings
+from django.core.files.storage import FileSystemStorage
+from django.utils.encoding import filepath_to_uri
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
 from accounts.models import User, Role
 from bookings.models import Appointment
+from bookings.pricing import price_appointment, price_appointments
+from bookings.utils import assign_staff, booking_conflicts
+from services.coupons import coupon_cache
 from services.models import Service, Coupon
+from services.search import DURATION_BUCKETS, PRICE_BUCKETS
+from .tasks import send_password_reset_email
 from django.utils import timezone
-from decimal import Decimal
+from decimal import ROUND_HALF_UP, Decimal
+from operator import itemgetter
+from datetime import timedelta
 from django.contrib.auth.tokens import default_token_generator
-from django.core.mail import send_mail
+from django.utils.http import urlsafe_base64_decode
+
+
+class SparseFieldsMixin:
+    """
+    Lets a serializer render only the fields a client asked for.
+
+    ``fields`` drops every other field, so their method fields are never
+    evaluated. When ``fields`` is given, relations listed in
+    ``collapsed_fields`` are rendered as ids unless also named in ``expand``.
+    """
+
+    # field name -> factory of the field used when it is not expanded
+    collapsed_fields = {}
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is None:
+            return
+        for name in list(self.fields):
+            if name not in fields:
+                self.fields.pop(name)
+        for name, collapsed_field in self.collapsed_fields.items():
+            if name in self.fields and name not in (expand or ()):
+                self.fields[name] = collapsed_field()
 
 
 class PasswordResetSerializer(serializers.Serializer):
@@ -24,16 +58,8 @@ class PasswordResetSerializer(serializers.Serializer):
     def save(self):
         email = self.validated_data["email"]
         user = User.objects.get(email=email)
-        token = default_token_generator.make_token(user)
-        reset_url = (
-            f"http://localhost:3000/reset-password/{token}/"  # Adjust URL as needed
-        )
-        send_mail(
-            "Password Reset Request",
-            f"To reset your password, click the link: {reset_url}",
-            "no-reply@yourdomain.com",
-            [user.email],
-        )
+        # Sent by a job worker, see api.tasks
+        send_password_reset_email.enqueue(user_id=user.pk)
         return user
 
 
@@ -41,6 +67,9 @@ class PasswordResetConfirmSerializer(serializers.Serializer):
     password = serializers.CharField(
         write_only=True, required=True, min_length=8, style={"input_type": "password"}
     )
+    uid = serializers.CharField(
+        write_only=True, required=True, help_text="User id from the reset link"
+    )
     token = serializers.CharField(write_only=True, required=True)
 
     def validate(self, attrs):
@@ -51,21 +80,19 @@ class PasswordResetConfirmSerializer(serializers.Serializer):
         except Exception as e:
             raise serializers.ValidationError({"password": list(e)})
 
+        # The link names the user, so checking it is one lookup and one HMAC
+        try:
+            user = User.objects.get(pk=urlsafe_base64_decode(attrs["uid"]).decode())
+        except (ValueError, OverflowError, User.DoesNotExist):
+            user = None
+        if user is None or not default_token_generator.check_token(
+            user, attrs["token"]
+        ):
+            raise serializers.ValidationError({"token": "Invalid or expired token"})
+
+        self.context["reset_user"] = user
         return attrs
 
-    def validate_token(self, value):
-        """
-        Custom token validation method
-        """
-        from django.contrib.auth.tokens import default_token_generator
-
-        for user in User.objects.all():
-            if default_token_generator.check_token(user, value):
-                self.context["reset_user"] = user
-                return value
-
-        raise serializers.ValidationError("Invalid or expired token")
-
     def save(self):
         user = self.context.get("reset_user")
         if not user:
@@ -204,7 +231,7 @@ class LoginSerializer(serializers.Serializer):
 
 
 # Service Serializer
-class ServiceSerializer(serializers.ModelSerializer):
+class ServiceSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     service_image_url = serializers.SerializerMethodField()
 
     class Meta:
@@ -229,6 +256,71 @@ class ServiceSerializer(serializers.ModelSerializer):
         return None
 
 
+def service_values(queryset, fields=None):
+    """
+    Return the ``.values()`` queryset service_rows reads, limited to the
+    columns behind the requested fields.
+    """
+    columns = [
+        "service_image" if name == "service_image_url" else name
+        for name in ServiceSerializer.Meta.fields
+        if fields is None or name in fields
+    ]
+    return queryset.values(*columns)
+
+
+def service_rows(rows, request=None, fields=None):
+    """
+    Read-only fast path producing the same output as ServiceSerializer.
+
+    Takes rows from service_values() and formats them the way DRF does for
+    the current settings, resolving the media base URL once per call instead
+    of once per service. Keep in step with ServiceSerializer;
+    benchmark_service_catalog checks both render the same.
+    """
+    storage = Service._meta.get_field("service_image").storage
+    media_base = None
+    if request is not None and isinstance(storage, FileSystemStorage):
+        media_base = request.build_absolute_uri(storage.base_url)
+
+    def image_url(row):
+        image = row["service_image"]
+        if not image or request is None:
+            return None
+        if media_base is not None:
+            return media_base + filepath_to_uri(image).lstrip("/")
+        return request.build_absolute_uri(storage.url(image))
+
+    formatters = {
+        "price": lambda row: _format_decimal(row["price"]),
+        "service_image_url": image_url,
+        "created_at": lambda row: _format_datetime(row["created_at"]),
+        "updated_at": lambda row: _format_datetime(row["updated_at"]),
+    }
+    columns = [
+        (name, formatters.get(name, itemgetter(name)))
+        for name in ServiceSerializer.Meta.fields
+        if fields is None or name in fields
+    ]
+    return [{name: value(row) for name, value in columns} for row in rows]
+
+
+def _format_decimal(value):
+    if value is None:
+        return None
+    value = value.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+    return "{:f}".format(value) if api_settings.COERCE_DECIMAL_TO_STRING else value
+
+
+def _format_datetime(value):
+    if value is None:
+        return None
+    value = timezone.localtime(value).isoformat()
+    if value.endswith("+00:00"):
+        value = value[:-6] + "Z"
+    return value
+
+
 class AppointmentCreateSerializer(serializers.ModelSerializer):
     services = serializers.PrimaryKeyRelatedField(
         queryset=Service.objects.all(), many=True
@@ -247,24 +339,39 @@ class AppointmentCreateSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         # Pop services and coupon from validated_data to avoid direct assignment
         services_data = validated_data.pop("services", [])
-        coupon_data = validated_data.pop("coupon", None)
-
-        # Create the appointment without services and coupon first
-        appointment = Appointment.objects.create(**validated_data)
+        coupon_data = validated_data.pop("coupon", None) or self.context.get("coupon")
 
-        # Set services using .set() method
-        if services_data:
-            appointment.services.set(services_data)
+        # Overlapping staff bookings are rejected by the database
+        with booking_conflicts():
+            # Create the appointment with its coupon, then attach services
+            appointment = Appointment.objects.create(
+                coupon=coupon_data, **validated_data
+            )
 
-        # Set coupon if provided
-        if coupon_data:
-            appointment.coupon = coupon_data
+            if services_data:
+                appointment.services.add(*services_data)
 
-        appointment.save()
+            # Staff can only be chosen once the services are known
+            assign_staff(appointment, services_data)
         return appointment
 
 
-class AppointmentSerializer(serializers.ModelSerializer):
+class AppointmentListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        appointments = list(data.all() if hasattr(data, "all") else data)
+        if {"total_price", "price_breakdown"} & set(self.child.fields):
+            # Price every appointment up front instead of once per row
+            price_appointments(appointments)
+        return super().to_representation(appointments)
+
+
+class AppointmentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    collapsed_fields = {
+        "services": lambda: serializers.PrimaryKeyRelatedField(
+            many=True, read_only=True
+        ),
+    }
+
     services = ServiceSerializer(many=True)
     coupon = serializers.SerializerMethodField()
     status = serializers.ChoiceField(choices=Appointment.STATUS_CHOICES)
@@ -276,7 +383,7 @@ class AppointmentSerializer(serializers.ModelSerializer):
     # Total price method field
     @extend_schema_field(serializers.DecimalField(max_digits=10, decimal_places=2))
     def get_total_price(self, instance):
-        return instance.calculate_total_price()
+        return price_appointment(instance)["total_price"]
 
     # Coupon method field
     @extend_schema_field(serializers.DictField(allow_null=True))
@@ -301,14 +408,17 @@ class AppointmentSerializer(serializers.ModelSerializer):
 
     @extend_schema_field(serializers.CharField(required=False, allow_null=True))
     def get_payment_method(self, instance):
-        payment = instance.payment_set.first()
+        if hasattr(instance, "listed_payments"):
+            payment = next(iter(instance.listed_payments), None)
+        else:
+            payment = instance.payment_set.first()
         if payment:
             return payment.payment_method
 
     # Price breakdown method field
     @extend_schema_field(serializers.DictField())
     def get_price_breakdown(self, instance):
-        return instance.get_price_breakdown()
+        return price_appointment(instance)["breakdown"]
 
     # Declare method fields
     total_price = serializers.SerializerMethodField()
@@ -316,6 +426,7 @@ class AppointmentSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Appointment
+        list_serializer_class = AppointmentListSerializer
         fields = [
             "id",
             "user",
@@ -339,11 +450,7 @@ class AppointmentSerializer(serializers.ModelSerializer):
         if coupon_code:
             try:
                 current_time = timezone.now()
-                coupon = Coupon.objects.get(
-                    coupon_code=coupon_code,
-                    valid_from__lte=current_time,
-                    valid_until__gte=current_time,
-                )
+                coupon = coupon_cache.get_valid(coupon_code, current_time)
 
                 # Optional: Add additional coupon validation
                 # For example, check minimum purchase amount
@@ -379,17 +486,18 @@ class AppointmentSerializer(serializers.ModelSerializer):
         # Extract services
         services = validated_data.pop("services", [])
 
-        # Create appointment
-        appointment = Appointment.objects.create(**validated_data)
+        with booking_conflicts():
+            # Create appointment
+            appointment = Appointment.objects.create(**validated_data)
 
-        # Add services
-        if services:
-            appointment.services.set(services)
+            # Add services
+            if services:
+                appointment.services.set(services)
 
-        # Add coupon if validated in the validation step
-        if hasattr(self, "coupon"):
-            appointment.coupon = self.coupon
-            appointment.save()
+            # Add coupon if validated in the validation step
+            if hasattr(self, "coupon"):
+                appointment.coupon = self.coupon
+                appointment.save()
 
         return appointment
 
@@ -397,20 +505,21 @@ class AppointmentSerializer(serializers.ModelSerializer):
         """
         Custom update method to handle appointment updates with optional coupon
         """
-        # Handle services
-        services = validated_data.pop("services", None)
-        if services is not None:
-            instance.services.set(services)
+        with booking_conflicts():
+            # Handle services
+            services = validated_data.pop("services", None)
+            if services is not None:
+                instance.services.set(services)
 
-        # Handle coupon
-        if hasattr(self, "coupon"):
-            instance.coupon = self.coupon
+            # Handle coupon
+            if hasattr(self, "coupon"):
+                instance.coupon = self.coupon
 
-        # Update other fields
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
+            # Update other fields
+            for attr, value in validated_data.items():
+                setattr(instance, attr, value)
 
-        instance.save()
+            instance.save()
         return instance
 
     def to_representation(self, instance):
@@ -424,6 +533,127 @@ class AppointmentSerializer(serializers.ModelSerializer):
         return representation
 
 
+class AppointmentListQuerySerializer(serializers.Serializer):
+    """
+    Serializer for the appointment history filters
+    """
+
+    WHEN_CHOICES = [
+        ("all", "All"),
+        ("upcoming", "Upcoming"),
+        ("past", "Past"),
+    ]
+
+    user_id = serializers.IntegerField(required=False)
+    when = serializers.ChoiceField(
+        choices=WHEN_CHOICES,
+        default="all",
+        help_text="Upcoming appointments are listed soonest first, past ones most recent first",
+    )
+    status = serializers.ChoiceField(choices=Appointment.STATUS_CHOICES, required=False)
+
+
+class CartSerializer(serializers.Serializer):
+    services = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        help_text="IDs of the services in the cart",
+    )
+    coupon_code = serializers.CharField(
+        required=False, allow_blank=True, allow_null=True
+    )
+
+
+class CartQuoteSerializer(serializers.Serializer):
+    """
+    Serializer for pricing several carts in one request
+    """
+
+    MAX_CARTS = 50
+
+    carts = CartSerializer(many=True, allow_empty=False, max_length=MAX_CARTS)
+
+
+class ServiceSearchSerializer(serializers.Serializer):
+    """
+    Serializer for the service search filters
+    """
+
+    q = serializers.CharField(
+        required=False,
+        allow_blank=True,
+        max_length=200,
+        help_text="Search terms, web search syntax (quotes, OR, -word)",
+    )
+    price = serializers.ChoiceField(
+        choices=[key for key, _low, _high in PRICE_BUCKETS],
+        required=False,
+        help_text="Price range",
+    )
+    duration = serializers.ChoiceField(
+        choices=[key for key, _low, _high in DURATION_BUCKETS],
+        required=False,
+        help_text="Duration range in minutes",
+    )
+    limit = serializers.IntegerField(
+        default=20, min_value=1, max_value=100, help_text="Number of services to return"
+    )
+    offset = serializers.IntegerField(default=0, min_value=0)
+
+
+class FreeSlotSearchSerializer(serializers.Serializer):
+    """
+    Serializer for searching the earliest free appointment slots
+    """
+
+    MAX_RANGE_DAYS = 31
+
+    services = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        help_text="IDs of the services to be booked together",
+    )
+    start_date = serializers.DateField(help_text="First day to search")
+    end_date = serializers.DateField(
+        required=False, help_text="Last day to search (default: a week from start)"
+    )
+    limit = serializers.IntegerField(
+        default=10, min_value=1, max_value=100, help_text="Number of slots to return"
+    )
+
+    def validate(self, attrs):
+        start_date = attrs["start_date"]
+        end_date = attrs.setdefault("end_date", start_date + timedelta(days=6))
+        if end_date < start_date:
+            raise serializers.ValidationError(
+                {"end_date": "End date must not be before start date."}
+            )
+        if (end_date - start_date).days >= self.MAX_RANGE_DAYS:
+            raise serializers.ValidationError(
+                {"end_date": f"Search range cannot exceed {self.MAX_RANGE_DAYS} days."}
+            )
+        return attrs
+
+
+class ChainedSlotSearchSerializer(serializers.Serializer):
+    """
+    Serializer for searching back-to-back service sequences on a single day
+    """
+
+    services = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        help_text="IDs of the services to chain, in the preferred order",
+    )
+    date = serializers.DateField(help_text="Day to search")
+    limit = serializers.IntegerField(
+        default=5, min_value=1, max_value=20, help_text="Number of options to return"
+    )
+    keep_order = serializers.BooleanField(
+        default=True, help_text="Only consider the services in the given order"
+    )
+
+
 class PayPalPaymentCreateSerializer(serializers.Serializer):
     """
     Serializer for creating a PayPal payment
@@ -445,7 +675,7 @@ class PayPalPaymentCreateSerializer(serializers.Serializer):
         """
         user = self.context["request"].user
         try:
-            appointment = Appointment.objects.get(id=value, user=user)
+            appointment = Appointment.objects.get(id=value, user_id=user.pk)
             if appointment.status != "pending":
                 raise serializers.ValidationError(
                     "Only pending appointments can be paid."
@@ -461,18 +691,19 @@ class PayPalPaymentCreateSerializer(serializers.Serializer):
         appointment = Appointment.objects.get(id=self.validated_data["appointment_id"])
 
         # Get the total price of the appointment after discounts
-        total_price = appointment.calculate_total_price()
+        price = price_appointments([appointment])[appointment.pk]
+        total_price = price["total_price"]
 
         # If necessary, calculate price breakdown (itemized price)
         items = []
         item_total = Decimal("0")
 
-        for service in appointment.services.all():
-            service_price = service.price
+        for service in price["breakdown"]["services"]:
+            service_price = service["price"]
             item_total += service_price
             items.append(
                 {
-                    "name": service.service_name,
+                    "name": service["name"],
                     "price": "{:.2f}".format(service_price),
                     "currency": self.validated_data.get("currency", "USD"),
                     "quantity": 1,
@@ -0,0 +1,85 @@
+import logging
+
+from accounts.models import User
+from bookings.models import Appointment
+from django.conf import settings
+from django.contrib.auth.tokens import default_token_generator
+from django.core.mail import EmailMessage, send_mail
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+from jobs.registry import task
+
+from .invoices import invoice_storage, stored_invoice
+
+logger = logging.getLogger("api.tasks")
+
+
+@task(name="api.send_appointment_invoice")
+def send_appointment_invoice(appointment_id):
+    """
+    Generate and send an invoice PDF for the given appointment
+    """
+    appointment = (
+        Appointment.objects.select_related("user", "coupon")
+        .filter(pk=appointment_id)
+        .first()
+    )
+    if appointment is None:
+        logger.warning(f"Appointment #{appointment_id} is gone, no invoice sent")
+        return
+
+    # Stored invoices are only rendered again when their content changed
+    name, _digest = stored_invoice(appointment)
+    with invoice_storage().open(name, "rb") as invoice:
+        pdf = invoice.read()
+
+    # Create and send email with PDF attachment
+    email = EmailMessage(
+        subject=f"Invoice for Appointment #{appointment.id}",
+        body="Please find your appointment invoice attached.",
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[appointment.user.email],
+    )
+
+    # Attach PDF
+    email.attach(f"invoice_{appointment.id}.pdf", pdf, "application/pdf")
+
+    # Send email, failures are retried by the job queue
+    email.send()
+
+    logger.info(f"Invoice sent successfully for Appointment #{appointment.id}")
+
+
+@task(name="api.render_invoice")
+def render_invoice(appointment_id):
+    """
+    Render and store an appointment's invoice PDF if it is not stored yet
+    """
+    appointment = (
+        Appointment.objects.select_related("user", "coupon")
+        .filter(pk=appointment_id)
+        .first()
+    )
+    if appointment is not None:
+        stored_invoice(appointment)
+
+
+@task(name="api.send_password_reset_email")
+def send_password_reset_email(user_id):
+    """
+    Email a password reset link to the given user
+    """
+    user = User.objects.filter(pk=user_id).first()
+    if user is None:
+        return
+
+    uid = urlsafe_base64_encode(force_bytes(user.pk))
+    token = default_token_generator.make_token(user)
+    # Adjust URL as needed
+    reset_url = f"http://localhost:3000/reset-password/{uid}/{token}/"
+    send_mail(
+        "Password Reset Request",
+        f"To reset your password, click the link: {reset_url}",
+        "no-reply@yourdomain.com",
+        [user.email],
+    )
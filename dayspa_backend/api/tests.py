@@ -1,3 +1,755 @@
+import json
+import os
+import socketserver
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest import mock
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from django.contrib.auth.tokens import default_token_generator
+from django.core import mail
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+from django.test.utils import override_settings
+from jwt.algorithms import RSAAlgorithm
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from accounts.cache import user_cache
+from accounts.models import Role, User
+from api.authentication import ClaimsRefreshToken
+from api import invoices
+from api.google_auth import GoogleKeySet, verify_google_token
+from api.mail import close_connection_pools
+from api.renderers import FastJSONRenderer
+from bookings.models import Appointment, AppointmentStaff, Payment
+from bookings.utils import book_appointment
+from jobs.models import Job
+from jobs.worker import claim, perform
+from services.models import Coupon, Service
+
+
+class ListAppointmentsQueryCountTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="customer@example.com",
+            password="password",
+            user_role=Role.objects.create(role_name="Customer"),
+        )
+        now = timezone.now()
+        self.coupon = Coupon.objects.create(
+            coupon_code="SPRING10",
+            discount=Decimal("10"),
+            valid_from=now - timedelta(days=1),
+            valid_until=now + timedelta(days=1),
+        )
+        self.services = [
+            Service.objects.create(
+                service_name=f"Service {i}",
+                description="Test service",
+                duration=30,
+                price=Decimal("25.00"),
+                coupon=self.coupon if i % 2 else None,
+            )
+            for i in range(3)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_appointments(self, count):
+        # Bulk inserts keep the appointments unpriced, so pricing has to
+        # work from the prefetched services
+        start = timezone.now() + timedelta(days=1)
+        appointments = Appointment.objects.bulk_create(
+            Appointment(
+                user=self.user,
+                appointment_time=start + timedelta(hours=i),
+                status="canceled",
+                coupon=self.coupon if i % 2 else None,
+            )
+            for i in range(count)
+        )
+        Appointment.services.through.objects.bulk_create(
+            Appointment.services.through(appointment=appointment, service=service)
+            for appointment in appointments
+            for service in self.services
+        )
+        Payment.objects.bulk_create(
+            Payment(
+                appointment=appointment,
+                user=self.user,
+                amount=Decimal("75.00"),
+                payment_method="cash",
+                payment_status="completed",
+            )
+            for appointment in appointments[::2]
+        )
+
+    def count_list_queries(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                "/api/appointments/list_appointments/", {"page_size": 100, **params}
+            )
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.json()["data"]
+
+    def test_query_count_does_not_grow_with_appointments(self):
+        self.create_appointments(1)
+        single_count, data = self.count_list_queries()
+        self.assertEqual(len(data["results"]), 1)
+
+        self.create_appointments(499)
+        many_count, data = self.count_list_queries()
+        self.assertEqual(len(data["results"]), 100)
+        self.assertEqual(many_count, single_count)
+
+        # Deep pages cost the same as the first one
+        for _ in range(4):
+            deep_count, data = self.count_list_queries(cursor=data["next_cursor"])
+            self.assertEqual(deep_count, single_count)
+        self.assertIsNone(data["next_cursor"])
+
+    def test_listing_reads_prefetched_data(self):
+        self.create_appointments(2)
+        _, data = self.count_list_queries()
+
+        by_coupon = {bool(item["coupon"]): item for item in data["results"]}
+        self.assertEqual(by_coupon[False]["payment_method"], "cash")
+        self.assertIsNone(by_coupon[True]["payment_method"])
+        self.assertEqual(by_coupon[True]["coupon"]["coupon_code"], "SPRING10")
+        self.assertEqual(len(by_coupon[True]["services"]), 3)
+        self.assertEqual(by_coupon[True]["total_price"], 67.5)
+        self.assertEqual(by_coupon[False]["total_price"], 75.0)
+
+
+class ListAppointmentsPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="customer@example.com",
+            password="password",
+            user_role=Role.objects.create(role_name="Customer"),
+        )
+        now = timezone.now()
+        # Pairs of appointments share a time so pages split on the id
+        self.appointments = Appointment.objects.bulk_create(
+            Appointment(
+                user=self.user,
+                appointment_time=now + timedelta(days=offset // 2),
+                status="confirmed" if offset % 3 else "canceled",
+            )
+            for offset in range(-6, 6)
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def collect(self, **params):
+        ids, cursor = [], None
+        while True:
+            query = {"page_size": 5, **params}
+            if cursor:
+                query["cursor"] = cursor
+            response = self.client.get("/api/appointments/list_appointments/", query)
+            self.assertEqual(response.status_code, 200)
+            data = response.json()["data"]
+            ids.extend(item["id"] for item in data["results"])
+            cursor = data["next_cursor"]
+            if cursor is None:
+                return ids
+
+    def test_pages_follow_appointment_time_then_id(self):
+        expected = [
+            appointment.pk
+            for appointment in sorted(
+                self.appointments, key=lambda a: (a.appointment_time, a.pk)
+            )
+        ]
+        self.assertEqual(self.collect(), expected)
+
+    def test_filters(self):
+        now = timezone.now()
+        upcoming = self.collect(when="upcoming")
+        past = self.collect(when="past")
+        self.assertTrue(
+            all(
+                Appointment.objects.get(pk=pk).appointment_time >= now
+                for pk in upcoming
+            )
+        )
+        times = [Appointment.objects.get(pk=pk).appointment_time for pk in past]
+        self.assertEqual(times, sorted(times, reverse=True))
+        self.assertEqual(len(upcoming) + len(past), len(self.appointments))
+
+        canceled = self.collect(status="canceled")
+        self.assertEqual(
+            set(canceled),
+            {a.pk for a in self.appointments if a.status == "canceled"},
+        )
+
+    def test_invalid_cursor(self):
+        response = self.client.get(
+            "/api/appointments/list_appointments/", {"cursor": "not-a-cursor"}
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class CatalogETagTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.service = Service.objects.create(
+            service_name="Massage",
+            description="Test service",
+            duration=60,
+            price=Decimal("50.00"),
+        )
+        self.client = APIClient()
+
+    def test_etag_is_shared_and_changes_with_the_catalog(self):
+        etag = self.client.get("/api/service/")["ETag"]
+
+        # Another process, with an empty cache of its own, agrees on the ETag
+        cache.clear()
+        response = self.client.get("/api/service/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.service.price = Decimal("60.00")
+        self.service.save()
+        response = self.client.get("/api/service/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertIn(b"60.00", response.content)
+
+    def test_deleting_a_coupon_changes_the_etag(self):
+        coupon = Coupon.objects.create(
+            coupon_code="SUMMER",
+            discount=Decimal("10"),
+            valid_from=timezone.now(),
+            valid_until=timezone.now() + timedelta(days=1),
+        )
+        etag = self.client.get("/api/service/")["ETag"]
+        coupon.delete()
+        self.assertNotEqual(self.client.get("/api/service/")["ETag"], etag)
+
+
+class FastJSONRendererTests(TestCase):
+    def test_big_integers_fall_back_to_json_renderer(self):
+        data = {"id": 2**64, "ids": [-(2**63) - 1, 1]}
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+
+class ClaimsAuthenticationTests(TestCase):
+    def setUp(self):
+        user_cache.clear()
+        self.addCleanup(user_cache.clear)
+        self.user = User.objects.create_user(
+            email="staff@example.com", password="password", is_staff=True
+        )
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION="Bearer "
+            + str(ClaimsRefreshToken.for_user(self.user).access_token)
+        )
+
+    def test_cached_user_spares_the_user_query(self):
+        self.client.get("/api/auth/me/")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/appointments/list_appointments/")
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(
+            any("accounts_user" in query["sql"] for query in queries.captured_queries)
+        )
+
+    def test_deactivated_user_is_rejected(self):
+        self.assertEqual(self.client.get("/api/auth/me/").status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get("/api/auth/me/").status_code, 401)
+
+    def test_staff_access_follows_the_user_not_the_token(self):
+        customer = User.objects.create_user(
+            email="customer@example.com", password="password"
+        )
+        url = f"/api/appointments/list_appointments/?user_id={customer.pk}"
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.user.is_staff = False
+        self.user.save()
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class PasswordResetConfirmTests(TestCase):
+    url = "/api/auth/password_reset_confirm/"
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="customer@example.com", password="old-password"
+        )
+        self.uid = urlsafe_base64_encode(force_bytes(self.user.pk))
+        self.token = default_token_generator.make_token(self.user)
+        self.client = APIClient()
+
+    def confirm(self, uid, token, password="n3w-Passw0rd!"):
+        return self.client.post(
+            self.url,
+            {"uid": uid, "token": token, "password": password},
+            format="json",
+        )
+
+    def test_valid_link_resets_the_password(self):
+        self.assertEqual(self.confirm(self.uid, self.token).status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password("n3w-Passw0rd!"))
+
+    def test_tampered_or_reused_token_is_rejected(self):
+        tampered = self.token[:-1] + ("0" if self.token[-1] != "0" else "1")
+        response = self.confirm(self.uid, tampered)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("token", response.json()["data"])
+
+        self.assertEqual(self.confirm(self.uid, self.token).status_code, 200)
+        # The new password invalidates the token it was set with
+        response = self.confirm(self.uid, self.token, password="an0ther-Passw0rd!")
+        self.assertEqual(response.status_code, 400)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password("n3w-Passw0rd!"))
+
+    def test_invalid_uid_is_rejected(self):
+        other = User.objects.create_user(email="other@example.com", password="x")
+        for uid in (
+            "not-base64!",
+            urlsafe_base64_encode(b"abc"),
+            urlsafe_base64_encode(force_bytes(other.pk + 1000)),
+            # A real user's id does not carry someone else's token
+            urlsafe_base64_encode(force_bytes(other.pk)),
+        ):
+            with self.subTest(uid=uid):
+                response = self.confirm(uid, self.token)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("token", response.json()["data"])
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password("old-password"))
+
+
+class CartQuoteTests(TestCase):
+    def test_duplicate_services_are_priced_once(self):
+        service = Service.objects.create(
+            service_name="Massage",
+            description="Test service",
+            duration=60,
+            price=Decimal("50.00"),
+        )
+        client = APIClient()
+        client.force_authenticate(
+            User.objects.create_user(email="customer@example.com", password="x")
+        )
+        response = client.post(
+            "/api/appointments/quote_carts/",
+            {"carts": [{"services": [service.pk, service.pk]}]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["data"]["quotes"][0]["final_total"], 50.0)
+
+
+class PayPalExecuteTests(TestCase):
+    def test_confirming_an_overlapping_booking_conflicts(self):
+        customer = User.objects.create_user(email="customer@example.com", password="x")
+        staff = User.objects.create_user(email="staff@example.com", password="x")
+        service = Service.objects.create(
+            service_name="Massage",
+            description="Test service",
+            duration=60,
+            price=Decimal("50.00"),
+        )
+        start = timezone.now() + timedelta(days=1)
+        booked = book_appointment(customer, staff, [service], start)
+        # Canceled while unpaid, so it does not hold the slot yet
+        unpaid = Appointment.objects.create(
+            user=customer, appointment_time=start, status="canceled"
+        )
+        unpaid.services.set([service])
+        AppointmentStaff.objects.create(appointment=unpaid, staff=staff)
+
+        payment = mock.Mock(
+            id="PAY-1",
+            state="approved",
+            transactions=[
+                {
+                    "description": f"Appointment #{unpaid.pk}",
+                    "amount": {"total": "50.00"},
+                }
+            ],
+        )
+        payment.execute.return_value = True
+        client = APIClient()
+        client.force_authenticate(customer)
+        with mock.patch("api.views.paypalrestsdk.Payment.find", return_value=payment):
+            response = client.post(
+                "/api/paypal/execute_payment/",
+                {"payment_id": "PAY-1", "payer_id": "PAYER-1"},
+                format="json",
+            )
+
+        self.assertEqual(response.status_code, 409)
+        unpaid.refresh_from_db()
+        self.assertEqual(unpaid.status, "canceled")
+        self.assertEqual(Payment.objects.get().appointment, unpaid)
+        self.assertEqual(
+            AppointmentStaff.objects.get(
+                staff=staff, time_range__isnull=False
+            ).appointment,
+            booked,
+        )
+
+
+class KeySetHandler(BaseHTTPRequestHandler):
+    """
+    Serves the server's ``jwks`` the way Google serves its certificates.
+    """
+
+    def do_GET(self):
+        self.server.requests += 1
+        body = json.dumps(self.server.jwks).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Cache-Control", f"public, max-age={self.server.max_age}")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@override_settings(
+    SOCIALACCOUNT_PROVIDERS={"google": {"APP": {"client_id": "spa-client"}}}
+)
+class GoogleTokenVerificationTests(TestCase):
+    def setUp(self):
+        self.private_key = rsa.generate_private_key(
+            public_exponent=65537, key_size=2048
+        )
+        jwk = json.loads(RSAAlgorithm.to_jwk(self.private_key.public_key()))
+        jwk.update(kid="key-1", alg="RS256", use="sig")
+
+        self.server = HTTPServer(("127.0.0.1", 0), KeySetHandler)
+        self.server.jwks = {"keys": [jwk]}
+        self.server.max_age = 3600
+        self.server.requests = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        host, port = self.server.server_address
+        self.keys = GoogleKeySet(f"http://{host}:{port}/certs", timeout=1)
+
+    def make_token(self, kid="key-1", key=None, **claims):
+        now = int(time.time())
+        payload = {
+            "iss": "https://accounts.google.com",
+            "aud": "spa-client",
+            "sub": "1234567890",
+            "email": "guest@example.com",
+            "iat": now,
+            "exp": now + 3600,
+            **claims,
+        }
+        return jwt.encode(
+            payload, key or self.private_key, algorithm="RS256", headers={"kid": kid}
+        )
+
+    def test_valid_token(self):
+        claims = verify_google_token(self.make_token(), self.keys)
+        self.assertEqual(claims["email"], "guest@example.com")
+
+    def test_keys_are_cached_for_max_age(self):
+        for _ in range(3):
+            self.assertIsNotNone(verify_google_token(self.make_token(), self.keys))
+        self.assertEqual(self.server.requests, 1)
+
+    def test_keys_are_refetched_once_expired(self):
+        self.server.max_age = 0
+        for _ in range(2):
+            self.assertIsNotNone(verify_google_token(self.make_token(), self.keys))
+        self.assertEqual(self.server.requests, 2)
+
+    def test_unknown_key_refetch_is_rate_limited(self):
+        verify_google_token(self.make_token(), self.keys)
+        for _ in range(3):
+            self.assertIsNone(
+                verify_google_token(self.make_token(kid="key-2"), self.keys)
+            )
+        self.assertEqual(self.server.requests, 1)
+
+    def test_rejected_tokens(self):
+        now = int(time.time())
+        for claims in [
+            {"aud": "someone-else"},
+            {"iss": "https://evil.example.com"},
+            {"iat": now - 7200, "exp": now - 3600},
+        ]:
+            with self.subTest(claims=claims):
+                self.assertIsNone(
+                    verify_google_token(self.make_token(**claims), self.keys)
+                )
+
+    def test_forged_signature(self):
+        # Valid claims under a known key id, signed with someone else's key
+        other_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        forged = self.make_token(key=other_key)
+        with self.assertLogs("api.google_auth", "WARNING") as logs:
+            self.assertIsNone(verify_google_token(forged, self.keys))
+        self.assertIn("Signature verification failed", logs.output[0])
+
+    def test_unreachable_key_set(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.assertIsNone(verify_google_token(self.make_token(), self.keys))
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """
+    Speaks just enough SMTP for smtplib: EHLO, AUTH PLAIN, one message per
+    MAIL/RCPT/DATA transaction, RSET, NOOP and QUIT. With ``drop_after``
+    set, the connection is closed after that many messages.
+    """
+
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        delivered = 0
+        self.reply("220 localhost ready")
+        while line := self.rfile.readline():
+            command = line.decode().strip().upper()
+            if command.startswith("EHLO"):
+                self.wfile.write(b"250-localhost\r\n250 AUTH PLAIN\r\n")
+            elif command.startswith("AUTH PLAIN"):
+                with server.lock:
+                    server.logins += 1
+                self.reply("235 Authenticated")
+            elif command.startswith("DATA"):
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                with server.lock:
+                    server.messages += 1
+                delivered += 1
+                self.reply("250 Queued")
+                if delivered == server.drop_after:
+                    return
+            elif command.startswith("QUIT"):
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("250 OK")
+
+
+class SMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), SMTPHandler)
+        self.lock = threading.Lock()
+        self.connections = self.logins = self.messages = 0
+        self.drop_after = None
+
+
+class PooledEmailBackendTests(TestCase):
+    def setUp(self):
+        self.server = SMTPServer()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        host, port = self.server.server_address
+        settings = override_settings(
+            EMAIL_BACKEND="api.mail.PooledEmailBackend",
+            EMAIL_HOST=host,
+            EMAIL_PORT=port,
+            EMAIL_USE_SSL=False,
+            EMAIL_USE_TLS=False,
+            EMAIL_HOST_USER="mailer",
+            EMAIL_HOST_PASSWORD="secret",
+            EMAIL_TIMEOUT=5,
+            EMAIL_POOL_SIZE=2,
+            EMAIL_POOL_MAX_MESSAGES=3,
+            EMAIL_POOL_TIMEOUT=1,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        close_connection_pools()
+        self.addCleanup(close_connection_pools)
+
+    def messages(self, count):
+        return [
+            mail.EmailMessage(f"Message {i}", "Body", "spa@example.com", ["a@x.com"])
+            for i in range(count)
+        ]
+
+    def test_connection_is_reused_between_sends(self):
+        for message in self.messages(3):
+            self.assertEqual(message.send(), 1)
+        self.assertEqual(self.server.messages, 3)
+        self.assertEqual(self.server.connections, 1)
+        self.assertEqual(self.server.logins, 1)
+
+    def test_batch_respects_message_limit(self):
+        self.assertEqual(mail.get_connection().send_messages(self.messages(7)), 7)
+        self.assertEqual(self.server.messages, 7)
+        self.assertEqual(self.server.connections, 3)
+
+    def test_reconnects_when_server_drops_connection(self):
+        self.server.drop_after = 1
+        self.assertEqual(mail.get_connection().send_messages(self.messages(3)), 3)
+        self.assertEqual(self.server.messages, 3)
+        self.assertEqual(self.server.connections, 3)
+
+    def test_concurrent_senders_share_the_pool(self):
+        def send():
+            mail.get_connection().send_messages(self.messages(3))
+
+        threads = [threading.Thread(target=send) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.server.messages, 12)
+        self.assertLessEqual(self.server.connections, 4)
+
+    def test_unreachable_server(self):
+        self.server.shutdown()
+        self.server.server_close()
+        with self.assertRaises(OSError):
+            mail.send_mail("Subject", "Body", "spa@example.com", ["a@x.com"])
+        self.assertEqual(
+            mail.send_mail(
+                "Subject", "Body", "spa@example.com", ["a@x.com"], fail_silently=True
+            ),
+            0,
+        )
+
+
+class FakeRenderer:
+    def __init__(self):
+        self.renders = 0
+
+    def render(self, html):
+        self.renders += 1
+        return b"%PDF-" + html.encode()
+
+
+class InvoiceDownloadTests(TestCase):
+    def setUp(self):
+        invoice_root = tempfile.TemporaryDirectory()
+        self.addCleanup(invoice_root.cleanup)
+        settings = override_settings(INVOICE_ROOT=invoice_root.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.invoice_root = invoice_root.name
+
+        self.renderer = FakeRenderer()
+        patcher = mock.patch.object(
+            invoices, "pdf_renderer", return_value=self.renderer
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.customer = User.objects.create_user(
+            email="customer@example.com", password="password"
+        )
+        self.service = Service.objects.create(
+            service_name="Massage",
+            description="Test service",
+            duration=60,
+            price=Decimal("50.00"),
+        )
+        self.appointment = Appointment.objects.create(
+            user=self.customer,
+            appointment_time=timezone.now() + timedelta(days=1),
+            status="confirmed",
+        )
+        self.appointment.services.set([self.service])
+        self.url = f"/api/appointments/{self.appointment.pk}/invoice/"
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def run_jobs(self):
+        while (job := claim()) is not None:
+            perform(job)
+
+    def download(self, headers=None):
+        response = self.client.get(self.url, headers=headers)
+        if response.status_code in (200, 206):
+            response.body = b"".join(response.streaming_content)
+        return response
+
+    def test_render_is_queued_once_then_served(self):
+        for _ in range(2):
+            response = self.download()
+            self.assertEqual(response.status_code, 202)
+            self.assertEqual(response["Retry-After"], "5")
+        self.assertEqual(Job.objects.count(), 1)
+        self.assertEqual(self.renderer.renders, 0)
+
+        self.run_jobs()
+        response = self.download()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.body.startswith(b"%PDF"))
+        self.assertEqual(self.download().body, response.body)
+        self.assertEqual(self.renderer.renders, 1)
+
+        # Stored privately, outside MEDIA_ROOT, with no leftovers
+        stored = [files for _, _, files in os.walk(self.invoice_root)]
+        digest = response["ETag"].strip('"')
+        self.assertEqual(sum(stored, []), [f"{digest}.pdf"])
+
+    def test_conditional_and_range_requests(self):
+        self.download()
+        self.run_jobs()
+        full = self.download()
+        etag, size = full["ETag"], len(full.body)
+
+        self.assertEqual(self.download({"If-None-Match": etag}).status_code, 304)
+        partial = self.download({"Range": "bytes=0-9"})
+        self.assertEqual(partial.status_code, 206)
+        self.assertEqual(partial.body, full.body[:10])
+        self.assertEqual(partial["Content-Range"], f"bytes 0-9/{size}")
+        self.assertEqual(self.download({"Range": f"bytes={size}-"}).status_code, 416)
+        stale = self.download({"Range": "bytes=0-9", "If-Range": '"old"'})
+        self.assertEqual(stale.status_code, 200)
+
+        # The invoice bills the price snapshot, not the catalog's prices
+        self.service.price = Decimal("60.00")
+        self.service.save()
+        self.assertEqual(self.download({"If-None-Match": etag}).status_code, 304)
+
+        # A new snapshot makes a new invoice, rendered again
+        self.appointment.services.add(
+            Service.objects.create(
+                service_name="Facial",
+                description="Test service",
+                duration=30,
+                price=Decimal("30.00"),
+            )
+        )
+        self.assertEqual(self.download({"If-None-Match": etag}).status_code, 202)
+        self.run_jobs()
+        self.assertNotEqual(self.download()["ETag"], etag)
 
-# Create your tests here.
+    def test_other_customers_cannot_download(self):
+        other = User.objects.create_user(email="other@example.com", password="x")
+        self.client.force_authenticate(other)
+        self.assertEqual(self.download().status_code, 404)
@@ -1,3 +1,7 @@
+import re
+
+from django.http import FileResponse, HttpResponse
+from django.utils.http import parse_etags
 from rest_framework.response import Response
 from drf_spectacular.utils import OpenApiExample
 
@@ -24,3 +28,108 @@ def api_response(success, message, data=None, status_code=200, error_details=Non
             'data': error_details or {},  # Provide error details if available
             'status_code': status_code
         }, status=status_code)
+
+
+def requested_fields(request, param):
+    """
+    Parse a comma-separated query parameter such as ?fields= into a set of
+    names, or None when it is absent or empty.
+    """
+    value = request.query_params.get(param)
+    if not value:
+        return None
+    return {name.strip() for name in value.split(",") if name.strip()} or None
+
+
+BYTE_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class FileRange:
+    """
+    Read-only view of ``length`` bytes of a file, starting at ``start``.
+    """
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def byte_range(header, size):
+    """
+    Parse a single-range ``Range: bytes=`` header against a file size.
+
+    Returns:
+        tuple: Inclusive (start, end) offsets, or None to send the whole
+            file (no header, several ranges, or a malformed one)
+
+    Raises:
+        ValueError: If the range is well-formed but outside the file
+    """
+    match = BYTE_RANGE.match(header or "")
+    if match is None or match.group(1) == match.group(2) == "":
+        return None
+    first, last = match.groups()
+    if first == "":
+        # Suffix range: the last N bytes
+        if int(last) == 0 or size == 0:
+            raise ValueError("Unsatisfiable range")
+        return max(size - int(last), 0), size - 1
+    start = int(first)
+    end = size - 1 if last == "" else min(int(last), size - 1)
+    if last != "" and int(last) < start:
+        return None
+    if start >= size:
+        raise ValueError("Unsatisfiable range")
+    return start, end
+
+
+def file_response(request, file, size, etag, content_type, filename):
+    """
+    Stream a stored file with an ETag, answering If-None-Match with 304 and
+    a single-range Range header with 206 (416 when out of bounds). If-Range
+    falls back to the whole file when the ETag no longer matches.
+    """
+    headers = {"ETag": etag, "Accept-Ranges": "bytes", "Cache-Control": "private"}
+    if etag in parse_etags(request.headers.get("If-None-Match", "")):
+        file.close()
+        return HttpResponse(status=304, headers=headers)
+
+    if_range = request.headers.get("If-Range")
+    try:
+        requested = (
+            byte_range(request.headers.get("Range"), size)
+            if if_range is None or if_range == etag
+            else None
+        )
+    except ValueError:
+        file.close()
+        return HttpResponse(
+            status=416, headers={**headers, "Content-Range": f"bytes */{size}"}
+        )
+
+    if requested is None:
+        response = FileResponse(file, content_type=content_type, filename=filename)
+    else:
+        start, end = requested
+        response = FileResponse(
+            FileRange(file, start, end - start + 1),
+            status=206,
+            content_type=content_type,
+            filename=filename,
+        )
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Content-Length"] = end - start + 1
+    for name, value in headers.items():
+        response[name] = value
+    return response
@@ -1,16 +1,22 @@
 import logging
+from functools import wraps
 from decimal import Decimal
 
 import paypalrestsdk
-import requests
+from accounts.cache import user_cache
 from accounts.models import Role
 from allauth.socialaccount.models import SocialAccount
 from bookings.models import Appointment, Payment
+from bookings.pricing import cart_totals, price_appointments, quote_carts
+from bookings.solver import ChainSolver
+from bookings.utils import SlotUnavailableError, booking_conflicts, find_free_slots
 from core import settings
 from django.contrib.auth import authenticate, get_user_model
-from django.db.models import Sum
+from django.db import transaction
 from django.utils import timezone
+from django.utils.http import parse_etags
 from drf_spectacular.utils import OpenApiExample, OpenApiParameter, extend_schema
+from jobs.models import Job
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.exceptions import NotFound
@@ -19,107 +25,83 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.serializers import Serializer
 from rest_framework.views import APIView
-from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.exceptions import TokenError
 from rest_framework_simplejwt.tokens import RefreshToken
+from services.catalog import cache_response, catalog_etag, get_cached_response
+from services.coupons import coupon_cache
 from services.models import Coupon, Service
-from weasyprint import HTML
-from django.core.mail import EmailMessage
-from django.template.loader import render_to_string
-import io
+from services.search import count_facets, faceted, pop_facets
 from .serializers import (
     AppointmentCreateSerializer,
+    AppointmentListQuerySerializer,
     AppointmentSerializer,
+    CartQuoteSerializer,
     CashPaymentCreateSerializer,
+    ChainedSlotSearchSerializer,
     ErrorResponseSerializer,
+    FreeSlotSearchSerializer,
     LoginSerializer,
     PasswordResetConfirmSerializer,
     PasswordResetSerializer,
     PayPalPaymentCreateSerializer,
     PayPalPaymentExecuteSerializer,
     RegisterSerializer,
+    ServiceSearchSerializer,
     ServiceSerializer,
     UserChangePassword,
     UserSerializer,
     UserUpdateSerializer,
+    service_rows,
+    service_values,
 )
 from rest_framework.exceptions import ValidationError
-from .utils import api_response
+from .authentication import ClaimsJWTAuthentication, ClaimsRefreshToken
+from .google_auth import verify_google_token
+from .invoices import RENDER_RETRY_AFTER, invoice_storage, locate_invoice
+from .pagination import AppointmentKeysetPagination
+from .tasks import render_invoice, send_appointment_invoice
+from .utils import api_response, file_response, requested_fields
 
 logger = logging.getLogger("api.views")
 
 
-def send_appointment_invoice(appointment):
-    """
-    Generate and send an invoice PDF for the given appointment
-    """
-    try:
-        # Prepare invoice details
-        services = appointment.services.all()
-        total_price = appointment.calculate_total_price()
-
-        # Render HTML invoice template
-        html_string = render_to_string(
-            "invoices/appointment_invoice.html",
-            {
-                "user": appointment.user,
-                "appointment": appointment,
-                "services": services,
-                "total_price": total_price,
-                "coupon": appointment.coupon
-                if hasattr(appointment, "coupon")
-                else None,
-            },
-        )
-
-        # Generate PDF from HTML
-        pdf_buffer = io.BytesIO()
-        HTML(string=html_string).write_pdf(pdf_buffer)
-        pdf_buffer.seek(0)
-
-        # Create and send email with PDF attachment
-        email = EmailMessage(
-            subject=f"Invoice for Appointment #{appointment.id}",
-            body="Please find your appointment invoice attached.",
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            to=[appointment.user.email],
-        )
-
-        # Attach PDF
-        email.attach(
-            f"invoice_{appointment.id}.pdf", pdf_buffer.getvalue(), "application/pdf"
-        )
-
-        # Send email
-        email.send()
+class ServicePagination(PageNumberPagination):
+    page_size = 10
+    page_size_query_param = "page_size"
+    max_page_size = 50
 
-        logger.info(f"Invoice sent successfully for Appointment #{appointment.id}")
 
-    except Exception as e:
-        logger.error(
-            f"Failed to send invoice for Appointment #{appointment.id}: {str(e)}"
-        )
+def catalog_cached(view_method):
+    """
+    Serve a catalog view from the response cache, keyed by the catalog
+    version, with a strong ETag and 304 for clients holding the current one.
+    """
 
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        etag = catalog_etag(request)
+        if_none_match = parse_etags(request.headers.get("If-None-Match", ""))
+        if "*" in if_none_match or etag in [
+            tag.removeprefix("W/") for tag in if_none_match
+        ]:
+            return Response(
+                status=status.HTTP_304_NOT_MODIFIED,
+                headers={"ETag": etag, "Cache-Control": "no-cache"},
+            )
 
-def verify_google_token(token):
-    """Verify the Google ID token using Google's token info endpoint."""
-    try:
-        google_url = f"https://oauth2.googleapis.com/tokeninfo?id_token={token}"
-        response = requests.get(google_url)
-        if response.status_code == 200:
-            return response.json()  # Returns the decoded token data
+        data = get_cached_response(etag)
+        if data is None:
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            cache_response(etag, response.data)
         else:
-            logger.error(f"Failed to verify token with Google: {response.status_code}")
-            return None
-    except Exception as e:
-        logger.error(f"Error verifying Google token: {e}")
-        return None
+            response = Response(data)
+        response["ETag"] = etag
+        response["Cache-Control"] = "no-cache"
+        return response
 
-
-class ServicePagination(PageNumberPagination):
-    page_size = 10
-    page_size_query_param = "page_size"
-    max_page_size = 50
+    return wrapper
 
 
 class EmptySerializer(Serializer):
@@ -196,7 +178,7 @@ class GoogleSignInView(APIView):
         logger.debug(f"Authenticated user: {user.username}")
 
         # Issue JWT tokens for the authenticated user
-        refresh = RefreshToken.for_user(user)
+        refresh = ClaimsRefreshToken.for_user(user)
         access_token = str(refresh.access_token)
         refresh_token = str(refresh)
 
@@ -258,28 +240,21 @@ class AuthViewSet(viewsets.ViewSet):
         """
         Handle the password reset confirmation with a new password.
         """
-        token = request.data.get("token")
-
-        # Remove email context
         serializer = PasswordResetConfirmSerializer(data=request.data)
-
-        try:
-            if serializer.is_valid(raise_exception=True):
-                serializer.save()  # Resets the password
-                return api_response(
-                    success=True,
-                    message="Password has been successfully reset.",
-                    data=None,
-                    status_code=status.HTTP_200_OK,
-                )
-        except ErrorResponseSerializer:
-            # This will catch validation errors from the serializer
+        if serializer.is_valid():
+            serializer.save()  # Resets the password
             return api_response(
-                success=False,
-                message="Password reset failed",
-                error_details=serializer.errors,
-                status_code=status.HTTP_400_BAD_REQUEST,
+                success=True,
+                message="Password has been successfully reset.",
+                data=None,
+                status_code=status.HTTP_200_OK,
             )
+        return api_response(
+            success=False,
+            message="Password reset failed",
+            error_details=serializer.errors,
+            status_code=status.HTTP_400_BAD_REQUEST,
+        )
 
     @extend_schema(
         request=UserUpdateSerializer,
@@ -288,7 +263,8 @@ class AuthViewSet(viewsets.ViewSet):
     )
     @action(detail=False, methods=["put"], permission_classes=[IsAuthenticated])
     def update_user_info(self, request):
-        user = request.user
+        # Fresh copy, request.user only carries the token's claims
+        user = get_user_model().objects.get(pk=request.user.pk)
         serializer = UserUpdateSerializer(user, data=request.data)
 
         if serializer.is_valid():
@@ -411,7 +387,7 @@ class AuthViewSet(viewsets.ViewSet):
         serializer = LoginSerializer(data=request.data)
         if serializer.is_valid():
             user = serializer.validated_data
-            refresh = RefreshToken.for_user(user)
+            refresh = ClaimsRefreshToken.for_user(user)
             access_token = str(refresh.access_token)
             refresh_token = str(refresh)
 
@@ -441,7 +417,7 @@ class AuthViewSet(viewsets.ViewSet):
     )
     @action(detail=False, methods=["get"], permission_classes=[IsAuthenticated])
     def me(self, request):
-        user = request.user
+        user = user_cache.get(request.user.pk)
         serializer = UserSerializer(user)
         return api_response(
             success=True,
@@ -508,28 +484,38 @@ class ServiceViewSet(viewsets.ReadOnlyModelViewSet):
     pagination_class = ServicePagination
 
     @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="fields",
+                type=str,
+                description="Comma-separated fields to return (default: all)",
+            ),
+        ],
         responses={
             200: ServiceSerializer(many=True),
             400: ErrorResponseSerializer,
         },
         description="Retrieve a paginated list of available services.",
     )
+    @catalog_cached
     def list(self, request, *args, **kwargs):
         """
         Retrieve a paginated list of all services.
         """
         try:
-            queryset = self.get_queryset()
+            # Plain rows instead of ServiceSerializer, same output
+            fields = requested_fields(request, "fields")
+            queryset = service_values(self.get_queryset(), fields)
             page = self.paginate_queryset(queryset)
             if page is not None:
-                serializer = self.get_serializer(page, many=True)
-                return self.get_paginated_response(serializer.data)
+                return self.get_paginated_response(
+                    service_rows(page, request, fields)
+                )
 
-            serializer = self.get_serializer(queryset, many=True)
             return api_response(
                 success=True,
                 message="Services retrieved successfully",
-                data=serializer.data,
+                data=service_rows(queryset, request, fields),
                 status_code=status.HTTP_200_OK,
             )
         except Exception as e:
@@ -541,19 +527,29 @@ class ServiceViewSet(viewsets.ReadOnlyModelViewSet):
             )
 
     @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="fields",
+                type=str,
+                description="Comma-separated fields to return (default: all)",
+            ),
+        ],
         responses={
             200: ServiceSerializer,
             400: ErrorResponseSerializer,
         },
         description="Retrieve the details of a specific service by its ID.",
     )
+    @catalog_cached
     def retrieve(self, request, *args, **kwargs):
         """
         Retrieve details of a specific service.
         """
         try:
             instance = self.get_object()
-            serializer = self.get_serializer(instance)
+            serializer = self.get_serializer(
+                instance, fields=requested_fields(request, "fields")
+            )
             return api_response(
                 success=True,
                 message="Service retrieved successfully",
@@ -568,6 +564,71 @@ class ServiceViewSet(viewsets.ReadOnlyModelViewSet):
                 status_code=status.HTTP_400_BAD_REQUEST,
             )
 
+    @extend_schema(
+        parameters=[
+            ServiceSearchSerializer,
+            OpenApiParameter(
+                name="fields",
+                type=str,
+                description="Comma-separated fields to return (default: all)",
+            ),
+        ],
+        responses={
+            200: ServiceSerializer(many=True),
+            400: ErrorResponseSerializer,
+        },
+        description=(
+            "Full-text search over service names and descriptions, filtered by "
+            "price and duration buckets, with the count of each bucket."
+        ),
+    )
+    @action(detail=False, methods=["get"])
+    @catalog_cached
+    def search(self, request):
+        """
+        Search services, returning a page of results and the facet counts.
+        """
+        serializer = ServiceSearchSerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return api_response(
+                success=False,
+                message="Invalid service search",
+                error_details=serializer.errors,
+                status_code=status.HTTP_400_BAD_REQUEST,
+            )
+
+        text = serializer.validated_data.get("q", "").strip()
+        price = serializer.validated_data.get("price")
+        duration = serializer.validated_data.get("duration")
+        offset = serializer.validated_data["offset"]
+        limit = serializer.validated_data["limit"]
+
+        queryset = self.get_queryset()
+        queryset = queryset.search(text) if text else queryset.order_by("pk")
+
+        # Rows and facet counts come back from one query
+        fields = requested_fields(request, "fields")
+        rows = list(
+            faceted(service_values(queryset, fields), price, duration)[
+                offset : offset + limit
+            ]
+        )
+        if rows:
+            facets = pop_facets(rows, price, duration)
+        else:
+            facets = count_facets(queryset, price, duration)
+
+        return api_response(
+            success=True,
+            message="Services retrieved successfully",
+            data={
+                "count": facets.pop("total"),
+                "facets": facets,
+                "results": service_rows(rows, request, fields),
+            },
+            status_code=status.HTTP_200_OK,
+        )
+
 
 class AppointmentViewSet(viewsets.ViewSet):
     """
@@ -593,11 +654,7 @@ class AppointmentViewSet(viewsets.ViewSet):
         if coupon_code:
             try:
                 current_time = timezone.now()
-                coupon = Coupon.objects.get(
-                    coupon_code=coupon_code,
-                    valid_from__lte=current_time,
-                    valid_until__gte=current_time,
-                )
+                coupon = coupon_cache.get_valid(coupon_code, current_time)
             except Coupon.DoesNotExist:
                 return api_response(
                     success=False,
@@ -615,19 +672,17 @@ class AppointmentViewSet(viewsets.ViewSet):
         )
 
         if serializer.is_valid():
-            appointment = serializer.save()
-
-            if coupon:
-                appointment.coupon = coupon
-                appointment.save()
-
-            # Send invoice asynchronously (recommended for production)
-            # You can use Celery or Django's background tasks for this
             try:
-                send_appointment_invoice(appointment)
-            except Exception as e:
-                # Log the error, but don't prevent appointment creation
-                logger.error(f"Invoice sending failed: {str(e)}")
+                # The invoice job is queued only if the booking commits
+                with transaction.atomic():
+                    appointment = serializer.save()
+                    send_appointment_invoice.enqueue(appointment_id=appointment.pk)
+            except SlotUnavailableError as e:
+                return api_response(
+                    success=False,
+                    message=str(e),
+                    status_code=status.HTTP_409_CONFLICT,
+                )
 
             return api_response(
                 success=True,
@@ -644,34 +699,81 @@ class AppointmentViewSet(viewsets.ViewSet):
         )
 
     @extend_schema(
-        responses={200: AppointmentSerializer(many=True)},
-        description="Retrieve all appointments for a specific user. If no user_id is provided, fetch appointments for the authenticated user.",
+        parameters=[
+            OpenApiParameter(name="user_id", type=int),
+            OpenApiParameter(name="when", type=str, enum=["all", "upcoming", "past"]),
+            OpenApiParameter(
+                name="status",
+                type=str,
+                enum=[choice for choice, _ in Appointment.STATUS_CHOICES],
+            ),
+            OpenApiParameter(name="cursor", type=str),
+            OpenApiParameter(name="page_size", type=int),
+            OpenApiParameter(
+                name="fields",
+                type=str,
+                description="Comma-separated fields to return (default: all)",
+            ),
+            OpenApiParameter(
+                name="expand",
+                type=str,
+                description="Relations to embed when fields is given, e.g. services",
+            ),
+        ],
+        responses={200: AppointmentSerializer(many=True), 400: ErrorResponseSerializer},
+        description="Retrieve a page of appointments for a specific user. If no user_id is provided, fetch appointments for the authenticated user.",
     )
     @action(detail=False, methods=["get"], permission_classes=[IsAuthenticated])
     def list_appointments(self, request):
         """
-        Retrieve appointments made by a specific user.
+        Retrieve appointments made by a specific user, one page at a time.
         If no user_id is provided, fetch appointments for the authenticated user.
+
+        Pages are ordered by appointment time; follow "next" (or pass
+        "next_cursor" as ?cursor=) to get the following page.
         """
-        user_id = request.query_params.get("user_id", None)
+        filters = AppointmentListQuerySerializer(data=request.query_params)
+        if not filters.is_valid():
+            return api_response(
+                success=False,
+                message="Invalid filters",
+                error_details=filters.errors,
+                status_code=status.HTTP_400_BAD_REQUEST,
+            )
+        user_id = filters.validated_data.get("user_id")
+        when = filters.validated_data["when"]
+        appointment_status = filters.validated_data.get("status")
 
-        if user_id:
-            if str(request.user.id) != user_id and not request.user.is_staff:
+        if user_id is not None:
+            if request.user.pk != user_id and not request.user.is_staff:
                 raise NotFound(
                     "You do not have permission to access this user's appointments."
                 )
             appointments = Appointment.objects.filter(user_id=user_id)
         else:
-            appointments = Appointment.objects.filter(user=request.user)
-
-        if not appointments.exists():
-            raise NotFound("No appointments found for this user.")
+            appointments = Appointment.objects.filter(user_id=request.user.pk)
+
+        if when == "upcoming":
+            appointments = appointments.filter(appointment_time__gte=timezone.now())
+        elif when == "past":
+            appointments = appointments.filter(appointment_time__lt=timezone.now())
+        if appointment_status:
+            appointments = appointments.filter(status=appointment_status)
+
+        fields = requested_fields(request, "fields")
+        expand = requested_fields(request, "expand")
+        paginator = AppointmentKeysetPagination(descending=when == "past")
+        page = paginator.paginate_queryset(
+            appointments.for_listing(fields, expand), request
+        )
 
-        serializer = AppointmentSerializer(appointments, many=True)
+        serializer = AppointmentSerializer(
+            page, many=True, fields=fields, expand=expand
+        )
         return api_response(
             success=True,
             message="Appointments retrieved successfully",
-            data=serializer.data,
+            data=paginator.get_paginated_data(serializer.data),
             status_code=status.HTTP_200_OK,
         )
 
@@ -689,14 +791,21 @@ class AppointmentViewSet(viewsets.ViewSet):
         Update an existing appointment by its ID.
         """
         try:
-            appointment = Appointment.objects.get(pk=pk, user=request.user)
+            appointment = Appointment.objects.get(pk=pk, user_id=request.user.pk)
         except Appointment.DoesNotExist:
             raise NotFound("Appointment not found.")
 
         serializer = AppointmentSerializer(appointment, data=request.data)
 
         if serializer.is_valid():
-            appointment = serializer.save()
+            try:
+                appointment = serializer.save()
+            except SlotUnavailableError as e:
+                return api_response(
+                    success=False,
+                    message=str(e),
+                    status_code=status.HTTP_409_CONFLICT,
+                )
             return api_response(
                 success=True,
                 message="Appointment updated successfully",
@@ -711,6 +820,67 @@ class AppointmentViewSet(viewsets.ViewSet):
             status_code=status.HTTP_400_BAD_REQUEST,
         )
 
+    @extend_schema(
+        responses={
+            (200, "application/pdf"): bytes,
+            (206, "application/pdf"): bytes,
+            202: None,
+            304: None,
+            404: ErrorResponseSerializer,
+            416: None,
+        },
+        description=(
+            "Download the invoice PDF of an appointment. Supports If-None-Match "
+            "and single byte ranges. While the PDF is being rendered, answers "
+            "202 with a Retry-After header."
+        ),
+        parameters=[
+            OpenApiParameter(name="id", type=int, location=OpenApiParameter.PATH)
+        ],
+    )
+    @action(detail=True, methods=["get"], permission_classes=[IsAuthenticated])
+    def invoice(self, request, pk: int):
+        """
+        Stream the stored invoice PDF. If its content changed since it was
+        last stored, queue a render in the job workers and ask the client to
+        retry instead of rendering in the request.
+        """
+        appointments = Appointment.objects.select_related("user", "coupon")
+        if not request.user.is_staff:
+            appointments = appointments.filter(user_id=request.user.pk)
+        try:
+            appointment = appointments.get(pk=pk)
+        except Appointment.DoesNotExist:
+            raise NotFound("Appointment not found.")
+
+        name, digest = locate_invoice(appointment)
+        storage = invoice_storage()
+        if not storage.exists(name):
+            payload = {"appointment_id": appointment.id}
+            pending = Job.objects.filter(
+                task=render_invoice.task_name,
+                payload=payload,
+                status__in=[Job.QUEUED, Job.RUNNING],
+            )
+            if not pending.exists():
+                render_invoice.enqueue(**payload)
+            response = api_response(
+                success=True,
+                message="Invoice is being generated, retry shortly",
+                status_code=status.HTTP_202_ACCEPTED,
+            )
+            response["Retry-After"] = RENDER_RETRY_AFTER
+            return response
+
+        return file_response(
+            request,
+            storage.open(name, "rb"),
+            storage.size(name),
+            etag=f'"{digest}"',
+            content_type="application/pdf",
+            filename=f"invoice_{appointment.id}.pdf",
+        )
+
     @action(detail=False, methods=["post"], permission_classes=[IsAuthenticated])
     def validate_coupon(self, request):
         """
@@ -727,39 +897,27 @@ class AppointmentViewSet(viewsets.ViewSet):
         coupon_code = request.data.get("coupon_code")
 
         # Validate services exist
-        services = Service.objects.filter(id__in=service_ids)
-        if not services.exists():
+        services = list(Service.objects.filter(id__in=service_ids))
+        if not services:
             return api_response(
                 success=False,
                 message="Invalid services selected",
                 status_code=status.HTTP_400_BAD_REQUEST,
             )
 
-        # Calculate base total
-        base_total = services.aggregate(total=Sum("price"))["total"] or Decimal("0")
-
         # If no coupon code provided, return base total
         if not coupon_code:
             return api_response(
                 success=True,
                 message="No coupon applied",
-                data={
-                    "base_total": base_total,
-                    "final_total": base_total,
-                    "discount_percentage": Decimal("0"),
-                    "discount_amount": Decimal("0"),
-                },
+                data=cart_totals(services),
                 status_code=status.HTTP_200_OK,
             )
 
         # Validate coupon
         try:
             current_time = timezone.now()
-            coupon = Coupon.objects.get(
-                coupon_code=coupon_code,
-                valid_from__lte=current_time,
-                valid_until__gte=current_time,
-            )
+            coupon = coupon_cache.get_valid(coupon_code, current_time)
         except Coupon.DoesNotExist:
             return api_response(
                 success=False,
@@ -767,30 +925,186 @@ class AppointmentViewSet(viewsets.ViewSet):
                 status_code=status.HTTP_400_BAD_REQUEST,
             )
 
-        # Calculate discount
-        discount_amount = base_total * coupon.discount / Decimal("100")
-        final_total = base_total - discount_amount
-
         return api_response(
             success=True,
             message="Coupon applied successfully",
+            data=cart_totals(services, coupon),
+            status_code=status.HTTP_200_OK,
+        )
+
+    @extend_schema(
+        request=CartQuoteSerializer,
+        responses={200: None, 400: ErrorResponseSerializer},
+        description="Price several carts, each with its own services and optional coupon, in one request.",
+    )
+    @action(detail=False, methods=["post"], permission_classes=[IsAuthenticated])
+    def quote_carts(self, request):
+        """
+        Price many cart variants at once.
+
+        Expected request data:
+        {
+            "carts": [
+                {"services": [1, 2], "coupon_code": "OPTIONAL_COUPON_CODE"},
+                {"services": [1]}
+            ]
+        }
+
+        Quotes are returned in the order of the carts. A cart with unknown
+        services or an invalid coupon gets an "error" instead of totals.
+        """
+        serializer = CartQuoteSerializer(data=request.data)
+        if not serializer.is_valid():
+            return api_response(
+                success=False,
+                message="Invalid carts",
+                error_details=serializer.errors,
+                status_code=status.HTTP_400_BAD_REQUEST,
+            )
+
+        return api_response(
+            success=True,
+            message="Carts priced successfully",
+            data={"quotes": quote_carts(serializer.validated_data["carts"])},
+            status_code=status.HTTP_200_OK,
+        )
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="services",
+                type=str,
+                description="Comma-separated service IDs",
+                required=True,
+            ),
+            OpenApiParameter(name="start_date", type=str, required=True),
+            OpenApiParameter(name="end_date", type=str),
+            OpenApiParameter(name="limit", type=int),
+        ],
+        responses={200: None, 400: ErrorResponseSerializer},
+        description="Find the earliest free start times for a set of services across all qualified staff.",
+    )
+    @action(detail=False, methods=["get"], permission_classes=[IsAuthenticated])
+    def next_available_slots(self, request):
+        """
+        Search for the earliest free slots in a date range.
+
+        Expected query parameters:
+            services=1,2&start_date=2024-12-01&end_date=2024-12-07&limit=10
+        """
+        data = request.query_params.dict()
+        data["services"] = [
+            service_id
+            for value in request.query_params.getlist("services")
+            for service_id in value.split(",")
+            if service_id
+        ]
+        serializer = FreeSlotSearchSerializer(data=data)
+        if not serializer.is_valid():
+            return api_response(
+                success=False,
+                message="Invalid slot search",
+                error_details=serializer.errors,
+                status_code=status.HTTP_400_BAD_REQUEST,
+            )
+
+        service_ids = set(serializer.validated_data["services"])
+        services = list(Service.objects.filter(id__in=service_ids))
+        if len(services) != len(service_ids):
+            return api_response(
+                success=False,
+                message="Invalid services selected",
+                status_code=status.HTTP_400_BAD_REQUEST,
+            )
+
+        slots = find_free_slots(
+            services,
+            serializer.validated_data["start_date"],
+            serializer.validated_data["end_date"],
+            serializer.validated_data["limit"],
+        )
+
+        return api_response(
+            success=True,
+            message="Available slots retrieved successfully",
             data={
-                "base_total": base_total,
-                "final_total": final_total,
-                "discount_percentage": coupon.discount,
-                "discount_amount": discount_amount,
-                "coupon_code": coupon.coupon_code,
+                "duration": sum(service.duration for service in services),
+                "slots": slots,
             },
             status_code=status.HTTP_200_OK,
         )
 
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="services",
+                type=str,
+                description="Comma-separated service IDs",
+                required=True,
+            ),
+            OpenApiParameter(name="date", type=str, required=True),
+            OpenApiParameter(name="limit", type=int),
+            OpenApiParameter(name="keep_order", type=bool),
+        ],
+        responses={200: None, 400: ErrorResponseSerializer},
+        description="Find back-to-back sequences of services, possibly with different staff for each service.",
+    )
+    @action(detail=False, methods=["get"], permission_classes=[IsAuthenticated])
+    def chained_slots(self, request):
+        """
+        Search for the earliest ways to book several services back to back.
+
+        Expected query parameters:
+            services=1,2&date=2024-12-01&limit=5&keep_order=true
+        """
+        data = request.query_params.dict()
+        data["services"] = [
+            service_id
+            for value in request.query_params.getlist("services")
+            for service_id in value.split(",")
+            if service_id
+        ]
+        serializer = ChainedSlotSearchSerializer(data=data)
+        if not serializer.is_valid():
+            return api_response(
+                success=False,
+                message="Invalid slot search",
+                error_details=serializer.errors,
+                status_code=status.HTTP_400_BAD_REQUEST,
+            )
+
+        service_ids = serializer.validated_data["services"]
+        services = Service.objects.in_bulk(service_ids)
+        if len(services) != len(set(service_ids)):
+            return api_response(
+                success=False,
+                message="Invalid services selected",
+                status_code=status.HTTP_400_BAD_REQUEST,
+            )
+
+        solver = ChainSolver(
+            [services[service_id] for service_id in service_ids],
+            serializer.validated_data["date"],
+        )
+        options, timed_out = solver.solve(
+            top_k=serializer.validated_data["limit"],
+            keep_order=serializer.validated_data["keep_order"],
+        )
+
+        return api_response(
+            success=True,
+            message="Chained options retrieved successfully",
+            data={"options": options, "timed_out": timed_out},
+            status_code=status.HTTP_200_OK,
+        )
+
 
 class PayPalPaymentViewSet(viewsets.GenericViewSet):
     """
     ViewSet for handling PayPal payments
     """
 
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [ClaimsJWTAuthentication]
     permission_classes = [IsAuthenticated]
     serializer_class = EmptySerializer  # Placeholder serializer for schema generation
 
@@ -817,20 +1131,21 @@ class PayPalPaymentViewSet(viewsets.GenericViewSet):
 
         # Fetch appointment and calculate total amount
         appointment = Appointment.objects.get(id=appointment_id)
+        price = price_appointments([appointment])[appointment.pk]
 
         # Initialize item total and items list
         item_total = Decimal("0")
         items = []
 
-        for service in appointment.services.all():
+        for service in price["breakdown"]["services"]:
             # Use base price (before any discount) for the item price
-            service_price = service.price
+            service_price = service["price"]
             item_total += service_price  # Adding base price to item total
 
             # Add the item to the PayPal items list
             items.append(
                 {
-                    "name": service.service_name,
+                    "name": service["name"],
                     "price": "{:.2f}".format(service_price),  # Base price for PayPal
                     "currency": currency,
                     "quantity": 1,
@@ -838,9 +1153,7 @@ class PayPalPaymentViewSet(viewsets.GenericViewSet):
             )
 
         # Get the final total price after discounts
-        final_total_price = (
-            appointment.calculate_total_price()
-        )  # Final total after discount
+        final_total_price = price["total_price"]  # Final total after discount
 
         # Log both values for debugging
         print(f"Item Total (before discount): {item_total}")
@@ -951,18 +1264,28 @@ class PayPalPaymentViewSet(viewsets.GenericViewSet):
                 # Update appointment status to "confirmed" after successful payment
                 appointment_id = payment.transactions[0]["description"].split("#")[-1]
                 appointment = Appointment.objects.get(id=appointment_id)
-                appointment.status = "confirmed"
-                appointment.save()
 
-                # Create a Payment record
+                # Create a Payment record; the money is captured whether or
+                # not the slot can still be confirmed
                 Payment.objects.create(
                     appointment=appointment,
-                    user=request.user,
+                    user_id=request.user.pk,
                     amount=Decimal(payment.transactions[0]["amount"]["total"]),
                     payment_method="paypal",
                     payment_status="completed",
                 )
 
+                try:
+                    with booking_conflicts():
+                        appointment.status = "confirmed"
+                        appointment.save()
+                except SlotUnavailableError as e:
+                    return api_response(
+                        success=False,
+                        message=str(e),
+                        status_code=status.HTTP_409_CONFLICT,
+                    )
+
                 return api_response(
                     success=True,
                     message="Payment executed successfully",
@@ -991,7 +1314,7 @@ class CashPaymentViewSet(viewsets.GenericViewSet):
     ViewSet for handling Cash payments
     """
 
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [ClaimsJWTAuthentication]
     permission_classes = [IsAuthenticated]
     serializer_class = CashPaymentCreateSerializer
 
@@ -1022,7 +1345,7 @@ class CashPaymentViewSet(viewsets.GenericViewSet):
             # Create Payment record
             payment = Payment.objects.create(
                 appointment=appointment,
-                user=request.user,
+                user_id=request.user.pk,
                 amount=total_amount,
                 payment_method="cash",
                 payment_status="pending",  # Assuming cash is marked as completed immediately
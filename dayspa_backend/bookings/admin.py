@@ -1,6 +1,7 @@
 from django.contrib import admin
 from unfold.admin import ModelAdmin
 from .models import Appointment, Payment, AppointmentStaff
+from .pricing import pricing_prefetches
 from accounts.models import Role, User
 from services.models import Service
 
@@ -29,6 +30,15 @@ class CustomAppointmentClass(ModelAdmin):
     # Readonly fields for calculated values
     readonly_fields = ["created_at", "display_price_breakdown", "coupon_details"]
 
+    def get_queryset(self, request):
+        # Load everything pricing needs with the changelist page
+        return (
+            super()
+            .get_queryset(request)
+            .select_related("user")
+            .prefetch_related(*pricing_prefetches())
+        )
+
     # Custom methods for display
     def user_email(self, obj):
         return obj.user.email
@@ -0,0 +1,45 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from accounts.models import User
+from bookings.models import StaffAvailability
+from services.models import StaffService
+
+
+class Command(BaseCommand):
+    help = "Rebuild the staff availability bitmaps for a date range"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--start", type=date.fromisoformat, help="First day (default: today)"
+        )
+        parser.add_argument(
+            "--days", type=int, default=90, help="Number of days to rebuild"
+        )
+
+    def handle(self, *args, **options):
+        start = options["start"] or timezone.localdate()
+        end = start + timedelta(days=options["days"] - 1)
+
+        staff_ids = set(
+            StaffService.objects.filter(date__range=(start, end)).values_list(
+                "staff_id", flat=True
+            )
+        ) | set(
+            User.objects.filter(assigned_appointments__isnull=False).values_list(
+                "id", flat=True
+            )
+        )
+
+        day = start
+        while day <= end:
+            StaffAvailability.objects.refresh((staff_id, day) for staff_id in staff_ids)
+            day += timedelta(days=1)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt availability for {len(staff_ids)} staff from {start} to {end}"
+            )
+        )
@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand
+from django.db.models import prefetch_related_objects
+
+from bookings.models import Appointment
+from bookings.pricing import price_appointment, pricing_prefetches, snapshot_fields
+
+SNAPSHOT_FIELDS = [
+    "base_total",
+    "discount_total",
+    "final_total",
+    "total_price",
+    "applied_coupon_code",
+    "price_lines",
+    "priced_at",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Store a price snapshot on appointments that do not have one yet. "
+        "Prices are taken from the current services, with coupons checked "
+        "as of when each appointment was booked."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size", type=int, default=500, help="Appointments per batch"
+        )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Re-price appointments that already have a snapshot",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        queryset = Appointment.objects.order_by("pk")
+        if not options["all"]:
+            queryset = queryset.filter(priced_at__isnull=True)
+
+        updated = 0
+        last_pk = 0
+        while True:
+            chunk = list(queryset.filter(pk__gt=last_pk)[:chunk_size])
+            if not chunk:
+                break
+            last_pk = chunk[-1].pk
+
+            for appointment in chunk:
+                # Price from live data rather than the snapshot being replaced
+                appointment.priced_at = None
+            prefetch_related_objects(chunk, *pricing_prefetches())
+            for appointment in chunk:
+                # A coupon counts if it was valid when the appointment was
+                # booked, not whether it still is today
+                booked_at = appointment.created_at
+                quote = price_appointment(appointment, booked_at)
+                for name, value in snapshot_fields(quote, booked_at).items():
+                    setattr(appointment, name, value)
+
+            Appointment.objects.bulk_update(chunk, SNAPSHOT_FIELDS)
+            updated += len(chunk)
+            self.stdout.write(f"Priced {updated} appointments")
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Stored price snapshots for {updated} appointments")
+        )
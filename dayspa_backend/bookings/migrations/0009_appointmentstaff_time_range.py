@@ -0,0 +1,61 @@
+# Generated by Django 5.1.3 on 2026-10-17 13:21
+
+from datetime import timedelta
+
+import django.contrib.postgres.fields.ranges
+from django.contrib.postgres.operations import BtreeGistExtension
+from django.db import migrations
+from django.db.backends.postgresql.psycopg_any import DateTimeTZRange
+from django.db.models import Sum
+
+BOOKED_STATUSES = ("pending", "confirmed", "completed")
+
+
+def backfill_time_ranges(apps, schema_editor):
+    """
+    Populate time_range for existing bookings.
+
+    Bookings that already overlap an earlier booking of the same staff member
+    are left without a range so the exclusion constraint can be created.
+    """
+    AppointmentStaff = apps.get_model("bookings", "AppointmentStaff")
+    rows = (
+        AppointmentStaff.objects.filter(
+            staff__isnull=False, appointment__status__in=BOOKED_STATUSES
+        )
+        .values("id", "staff_id", "appointment__appointment_time")
+        .annotate(duration=Sum("appointment__services__duration"))
+        .order_by("staff_id", "appointment__appointment_time", "id")
+    )
+
+    last_end = {}
+    for row in rows:
+        if not row["duration"]:
+            continue
+        start = row["appointment__appointment_time"]
+        end = start + timedelta(minutes=row["duration"])
+        if row["staff_id"] in last_end and start < last_end[row["staff_id"]]:
+            continue
+        last_end[row["staff_id"]] = end
+        AppointmentStaff.objects.filter(id=row["id"]).update(
+            time_range=DateTimeTZRange(start, end)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bookings", "0008_payment_payer_id_payment_payment_id_and_more"),
+    ]
+
+    operations = [
+        BtreeGistExtension(),
+        migrations.AddField(
+            model_name="appointmentstaff",
+            name="time_range",
+            field=django.contrib.postgres.fields.ranges.DateTimeRangeField(
+                blank=True, null=True
+            ),
+        ),
+        migrations.RunPython(backfill_time_ranges, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.3 on 2026-10-17 13:21
+
+import django.contrib.postgres.constraints
+from django.conf import settings
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bookings", "0009_appointmentstaff_time_range"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name="appointmentstaff",
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(
+                expressions=[("staff", "="), ("time_range", "&&")],
+                name="exclude_overlapping_staff_bookings",
+            ),
+        ),
+    ]
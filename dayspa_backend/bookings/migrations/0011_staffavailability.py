@@ -0,0 +1,108 @@
+# Generated by Django 5.1.3 on 2026-10-17 13:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+BATCH_SIZE = 1000
+
+
+def backfill_availability(apps, schema_editor):
+    """
+    Build the bitmaps of every staff member and day, from today on, that has
+    a working shift or a booking, as rebuild_staff_availability does.
+    """
+    # Only the model's pure bitmap helpers are used, never its queries
+    from bookings.models import StaffAvailability as Bitmaps
+    from bookings.models import availability_masks
+
+    StaffService = apps.get_model("services", "StaffService")
+    AppointmentStaff = apps.get_model("bookings", "AppointmentStaff")
+    StaffAvailability = apps.get_model("bookings", "StaffAvailability")
+
+    today = timezone.localdate()
+    shifts = list(
+        StaffService.objects.filter(
+            date__gte=today,
+            status="working",
+            start_time__isnull=False,
+            end_time__isnull=False,
+        ).values_list("staff_id", "date", "start_time", "end_time")
+    )
+    bookings = list(
+        AppointmentStaff.objects.filter(
+            staff__isnull=False,
+            time_range__isnull=False,
+            time_range__endswith__gt=Bitmaps.day_start(today),
+        ).values_list("staff_id", "time_range")
+    )
+
+    pairs = {(staff_id, day) for staff_id, day, _, _ in shifts}
+    for staff_id, time_range in bookings:
+        pairs |= {
+            (staff_id, day)
+            for staff_id, day in Bitmaps.days_touched(staff_id, time_range)
+            if day >= today
+        }
+
+    StaffAvailability.objects.bulk_create(
+        [
+            StaffAvailability(
+                staff_id=staff_id,
+                date=day,
+                shift_bits=Bitmaps.to_bits(shift_mask),
+                booked_bits=Bitmaps.to_bits(booked_mask),
+            )
+            for (staff_id, day), (shift_mask, booked_mask) in sorted(
+                availability_masks(pairs, shifts, bookings).items()
+            )
+        ],
+        batch_size=BATCH_SIZE,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bookings", "0010_appointmentstaff_exclude_overlapping_staff_bookings"),
+        (
+            "services",
+            "0005_alter_staffservice_unique_together_staffservice_date_and_more",
+        ),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StaffAvailability",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("shift_bits", models.BinaryField(max_length=36)),
+                ("booked_bits", models.BinaryField(max_length=36)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "staff",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="availability_bitmaps",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "staff availability",
+                "unique_together": {("staff", "date")},
+            },
+        ),
+        migrations.RunPython(backfill_availability, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.3 on 2026-10-17 13:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bookings", "0012_appointment_price_snapshot"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="appointment",
+            index=models.Index(
+                fields=["user", "appointment_time", "id"],
+                name="appointment_user_time_idx",
+            ),
+        ),
+    ]
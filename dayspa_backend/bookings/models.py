@@ -1,8 +1,13 @@
-from django.db import models
-from django.db.models import Sum, Q
-from decimal import Decimal
-
-from django.db.models.signals import post_save
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import DateTimeRangeField, RangeOperators
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.db.backends.postgresql.psycopg_any import DateTimeTZRange
+from django.db.models import Prefetch, Sum, Q
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save
 from django.dispatch import receiver
 from django.utils import timezone
 from accounts.models import User  # Import User from the accounts app
@@ -11,6 +16,51 @@ from services.models import (
     StaffService,
 )  # Import Service from the services app
 
+from .pricing import price_appointment, record_price
+
+# Appointment statuses that keep a staff member busy
+BOOKED_STATUSES = ("pending", "confirmed", "completed")
+
+
+class AppointmentQuerySet(models.QuerySet):
+    def for_listing(self, fields=None, expand=None):
+        """
+        Load everything AppointmentSerializer reads, so a page of
+        appointments costs the same number of queries however long it is.
+
+        With ``fields`` (and ``expand``) as passed to the serializer, only
+        the relations behind the requested fields are loaded.
+        """
+
+        def wanted(name):
+            return fields is None or name in fields
+
+        queryset = self
+        priced = wanted("total_price") or wanted("price_breakdown")
+        expanded = fields is None or "services" in (expand or ())
+        if priced or wanted("coupon"):
+            queryset = queryset.select_related("coupon")
+        # Pricing alone needs no prefetch here: price_appointments loads the
+        # services of appointments without a price snapshot itself
+        if wanted("services") and (expanded or priced):
+            queryset = queryset.prefetch_related(
+                Prefetch("services", queryset=Service.objects.select_related("coupon"))
+            )
+        elif wanted("services"):
+            # Rendered as ids only
+            queryset = queryset.prefetch_related(
+                Prefetch("services", queryset=Service.objects.only("id"))
+            )
+        if wanted("payment_method"):
+            queryset = queryset.prefetch_related(
+                Prefetch(
+                    "payment_set",
+                    queryset=Payment.objects.order_by("pk"),
+                    to_attr="listed_payments",
+                )
+            )
+        return queryset
+
 
 class Appointment(models.Model):
     STATUS_CHOICES = [
@@ -38,97 +88,86 @@ class Appointment(models.Model):
         related_name="appointments",
     )
 
-    def calculate_total_price(self):
-        base_total = self.services.aggregate(total=Sum("price"))["total"] or Decimal(
-            "0"
-        )
-        total_discount = Decimal("0")
-        current_time = timezone.now()  # This returns a timezone-aware datetime
-
-        # Ensure the coupon's datetime fields are timezone-aware
-        if self.coupon:
-            valid_from = self.coupon.valid_from
-            valid_until = self.coupon.valid_until
+    objects = AppointmentQuerySet.as_manager()
 
-            # Ensure coupon datetime fields are timezone-aware
-            if valid_from and valid_from.tzinfo is None:
-                valid_from = timezone.make_aware(valid_from)
+    # Price snapshot taken when the appointment is booked, so later changes
+    # to service prices or coupons do not alter what the customer was quoted
+    base_total = models.DecimalField(
+        max_digits=10, decimal_places=2, null=True, blank=True
+    )
+    discount_total = models.DecimalField(
+        max_digits=10, decimal_places=2, null=True, blank=True
+    )
+    final_total = models.DecimalField(
+        max_digits=10, decimal_places=2, null=True, blank=True
+    )
+    total_price = models.DecimalField(
+        max_digits=10, decimal_places=2, null=True, blank=True
+    )
+    applied_coupon_code = models.CharField(max_length=50, null=True, blank=True)
+    price_lines = models.JSONField(default=list, blank=True, encoder=DjangoJSONEncoder)
+    priced_at = models.DateTimeField(null=True, blank=True)
 
-            if valid_until and valid_until.tzinfo is None:
-                valid_until = timezone.make_aware(valid_until)
+    class Meta:
+        indexes = [
+            # Serves keyset pagination of a user's appointment history
+            models.Index(
+                fields=["user", "appointment_time", "id"],
+                name="appointment_user_time_idx",
+            ),
+        ]
+
+    def total_duration(self):
+        return self.services.aggregate(total=Sum("duration"))["total"] or 0
+
+    def booking_range(self, duration=None):
+        """
+        Return the time range this appointment occupies its staff for, or None
+        when its status does not block the staff member's calendar.
+        """
+        if self.status not in BOOKED_STATUSES:
+            return None
+        if duration is None:
+            duration = self.total_duration()
+        if not duration:
+            return None
+        return DateTimeTZRange(
+            self.appointment_time, self.appointment_time + timedelta(minutes=duration)
+        )
 
-            # Compare timezone-aware datetimes
-            if valid_from <= current_time <= valid_until:
-                total_discount = base_total * self.coupon.discount / Decimal("100")
+    def sync_booking_range(self, duration=None):
+        """
+        Refresh the time range stored on this appointment's staff assignment.
+        """
+        assignments = list(
+            AppointmentStaff.objects.filter(appointment=self).values_list(
+                "staff_id", "time_range"
+            )
+        )
+        if not assignments:
+            return
+        time_range = self.booking_range(duration)
+        if all(old_range == time_range for _, old_range in assignments):
+            return
+
+        AppointmentStaff.objects.filter(appointment=self).update(time_range=time_range)
+
+        # .update() skips signals, so refresh the affected bitmaps here
+        StaffAvailability.objects.refresh(
+            StaffAvailability.days_touched(staff_id, old_range)
+            | StaffAvailability.days_touched(staff_id, time_range)
+            for staff_id, old_range in assignments
+        )
 
-        final_price = base_total - total_discount
-        return max(final_price, Decimal("0"))
+    def calculate_total_price(self):
+        return price_appointment(self)["total_price"]
 
     def get_price_breakdown(self):
-        breakdown = {
-            "services": [],
-            "base_total": Decimal("0"),
-            "total_discount": Decimal("0"),
-            "final_total": Decimal("0"),
-            "applied_coupon": None,  # To show the coupon applied to the whole appointment
-        }
-
-        current_time = timezone.now()  # This returns a timezone-aware datetime
-
-        for service in self.services.all():
-            service_detail = {
-                "name": service.service_name,
-                "price": service.price,
-                "discount": Decimal("0"),
-            }
-
-            # Ensure the service's coupon datetime fields are timezone-aware
-            if service.coupon:
-                valid_from = service.coupon.valid_from
-                valid_until = service.coupon.valid_until
-
-                if valid_from and valid_from.tzinfo is None:
-                    valid_from = timezone.make_aware(valid_from)
-
-                if valid_until and valid_until.tzinfo is None:
-                    valid_until = timezone.make_aware(valid_until)
-
-                # Compare timezone-aware datetimes
-                if valid_from <= current_time <= valid_until:
-                    service_detail["discount"] = (
-                        service.price * service.coupon.discount / Decimal("100")
-                    )
-                    service_detail["coupon_code"] = service.coupon.coupon_code
-
-            breakdown["services"].append(service_detail)
-            breakdown["base_total"] += service.price
-            breakdown["total_discount"] += service_detail["discount"]
-
-        # Apply the appointment-wide coupon discount if available
-        if self.coupon:
-            valid_from = self.coupon.valid_from
-            valid_until = self.coupon.valid_until
-
-            if valid_from and valid_from.tzinfo is None:
-                valid_from = timezone.make_aware(valid_from)
-
-            if valid_until and valid_until.tzinfo is None:
-                valid_until = timezone.make_aware(valid_until)
-
-            if valid_from <= current_time <= valid_until:
-                breakdown["applied_coupon"] = self.coupon.coupon_code
-                breakdown["total_discount"] += (
-                    breakdown["base_total"] * self.coupon.discount / Decimal("100")
-                )
-
-        breakdown["final_total"] = breakdown["base_total"] - breakdown["total_discount"]
-        return breakdown
+        return price_appointment(self)["breakdown"]
 
     def has_coupon_codes(self):
         # This method checks if there is any coupon applied to the services or the appointment itself
-        return bool(self.coupon) or any(
-            service.applied_coupon_code for service in self.services.all()
-        )
+        return bool(self.get_applied_coupon_codes())
 
     def get_applied_coupon_codes(self):
         # This method retrieves the coupon codes applied to the appointment and services
@@ -136,9 +175,9 @@ class Appointment(models.Model):
         if self.coupon:
             applied_coupons.append(self.coupon.coupon_code)
         applied_coupons.extend(
-            service.applied_coupon_code
-            for service in self.services.all()
-            if service.applied_coupon_code
+            service["coupon_code"]
+            for service in self.get_price_breakdown()["services"]
+            if "coupon_code" in service
         )
         return applied_coupons
 
@@ -172,31 +211,6 @@ class Payment(models.Model):
     payer_id = models.CharField(max_length=255, null=True, blank=True)
 
 
-@receiver(post_save, sender=Appointment)
-def assign_staff_to_appointment(sender, instance, created, **kwargs):
-    if created:
-        # Find primary staff for the services
-        primary_staff = StaffService.objects.filter(
-            service__in=instance.services.all(), is_primary=True
-        ).first()
-
-        # If no primary staff, find any available staff for the services
-        if not primary_staff:
-            primary_staff = StaffService.objects.filter(
-                service__in=instance.services.all()
-            ).first()
-
-        # If staff found, create an AppointmentStaff record
-        if primary_staff:
-            AppointmentStaff.objects.create(
-                appointment=instance, staff=primary_staff.staff
-            )
-        else:
-            # Optional: You might want to handle the case when no staff is found
-            # This could be logging, sending an notification, etc.
-            pass
-
-
 class AppointmentStaff(models.Model):
     appointment = models.OneToOneField(
         Appointment, on_delete=models.CASCADE, related_name="appointment_staff"
@@ -204,10 +218,372 @@ class AppointmentStaff(models.Model):
     staff = models.ForeignKey(
         User, on_delete=models.SET_NULL, null=True, related_name="assigned_appointments"
     )
+    # Occupied time range; NULL while the appointment does not block the staff member
+    time_range = DateTimeRangeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         unique_together = ("appointment", "staff")
+        constraints = [
+            ExclusionConstraint(
+                name="exclude_overlapping_staff_bookings",
+                expressions=[
+                    ("staff", RangeOperators.EQUAL),
+                    ("time_range", RangeOperators.OVERLAPS),
+                ],
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.time_range is None and self.appointment_id:
+            self.time_range = self.appointment.booking_range()
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.appointment} - {self.staff}"
+
+
+@receiver(post_save, sender=Appointment)
+def sync_appointment_booking_range(sender, instance, created, **kwargs):
+    if not created:
+        instance.sync_booking_range()
+
+
+@receiver(m2m_changed, sender=Appointment.services.through)
+def sync_booking_range_on_services_change(sender, instance, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear") and isinstance(
+        instance, Appointment
+    ):
+        instance.sync_booking_range()
+
+
+@receiver(post_init, sender=Appointment)
+def remember_priced_coupon(sender, instance, **kwargs):
+    instance._priced_coupon_id = instance.__dict__.get("coupon_id")
+
+
+@receiver(post_save, sender=Appointment)
+def snapshot_price_on_coupon_change(sender, instance, created, **kwargs):
+    # New appointments are priced once their services are added
+    if not created and instance.coupon_id != instance._priced_coupon_id:
+        record_price(instance)
+    instance._priced_coupon_id = instance.coupon_id
+
+
+@receiver(m2m_changed, sender=Appointment.services.through)
+def snapshot_price_on_services_change(sender, instance, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear") and isinstance(
+        instance, Appointment
+    ):
+        record_price(instance)
+
+
+def availability_masks(pairs, shifts, bookings):
+    """
+    Compute the bitmaps of (staff id, date) pairs.
+
+    Args:
+        pairs (set): (staff id, date) pairs to compute
+        shifts (iterable): (staff id, date, start time, end time) rows of
+            working shifts
+        bookings (iterable): (staff id, time range) rows of bookings
+
+    Returns:
+        dict: (staff id, date) -> (shift mask, booked mask)
+    """
+    shift_masks = defaultdict(int)
+    booked_masks = defaultdict(int)
+    for staff_id, day, start_time, end_time in shifts:
+        if (staff_id, day) not in pairs:
+            continue
+        start = timezone.make_aware(datetime.combine(day, start_time))
+        end = timezone.make_aware(datetime.combine(day, end_time))
+        for mask_day, mask in StaffAvailability.range_masks(start, end):
+            if mask_day == day:
+                shift_masks[(staff_id, day)] |= mask
+    for staff_id, time_range in bookings:
+        for day, mask in StaffAvailability.range_masks(
+            time_range.lower, time_range.upper, covering=True
+        ):
+            if (staff_id, day) in pairs:
+                booked_masks[(staff_id, day)] |= mask
+    return {pair: (shift_masks[pair], booked_masks[pair]) for pair in pairs}
+
+
+class StaffAvailabilityManager(models.Manager):
+    def refresh(self, days):
+        """
+        Recompute the bitmaps of the given (staff id, date) pairs.
+
+        ``days`` may also be an iterable of sets of pairs. The bitmap rows
+        are locked before shifts and bookings are read, so concurrent
+        refreshes of the same staff member and day run one after another
+        and each sees what the previous one committed.
+        """
+        pairs = set()
+        for item in days:
+            for staff_id, day in item if isinstance(item, (set, frozenset)) else [item]:
+                if staff_id is None or day is None:
+                    continue
+                if isinstance(day, datetime):
+                    day = (
+                        timezone.localdate(day)
+                        if timezone.is_aware(day)
+                        else day.date()
+                    )
+                pairs.add((staff_id, day))
+        if not pairs:
+            return
+
+        staff_ids = {staff_id for staff_id, _ in pairs}
+        dates = {day for _, day in pairs}
+        empty = StaffAvailability.to_bits(0)
+        with transaction.atomic():
+            self.bulk_create(
+                [
+                    StaffAvailability(
+                        staff_id=staff_id, date=day, shift_bits=empty, booked_bits=empty
+                    )
+                    for staff_id, day in sorted(pairs)
+                ],
+                ignore_conflicts=True,
+            )
+            # A fixed lock order keeps concurrent refreshes from deadlocking
+            list(
+                self.select_for_update()
+                .filter(staff_id__in=staff_ids, date__in=dates)
+                .order_by("staff_id", "date")
+                .values_list("pk", flat=True)
+            )
+
+            shifts = StaffService.objects.filter(
+                staff_id__in=staff_ids,
+                date__in=dates,
+                status="working",
+                start_time__isnull=False,
+                end_time__isnull=False,
+            ).values_list("staff_id", "date", "start_time", "end_time")
+            bookings = AppointmentStaff.objects.filter(
+                staff_id__in=staff_ids,
+                time_range__overlap=(
+                    StaffAvailability.day_start(min(dates)),
+                    StaffAvailability.day_start(max(dates) + timedelta(days=1)),
+                ),
+            ).values_list("staff_id", "time_range")
+
+            self.bulk_create(
+                [
+                    StaffAvailability(
+                        staff_id=staff_id,
+                        date=day,
+                        shift_bits=StaffAvailability.to_bits(shift_mask),
+                        booked_bits=StaffAvailability.to_bits(booked_mask),
+                    )
+                    for (staff_id, day), (shift_mask, booked_mask) in sorted(
+                        availability_masks(pairs, shifts, bookings).items()
+                    )
+                ],
+                update_conflicts=True,
+                unique_fields=["staff", "date"],
+                update_fields=["shift_bits", "booked_bits", "updated_at"],
+            )
+
+    def free_masks(self, staff_ids, start_date, end_date):
+        """
+        Return {(staff id, date): free slot mask} for a date range in one read.
+        """
+        rows = self.filter(
+            staff_id__in=staff_ids, date__range=(start_date, end_date)
+        ).values_list("staff_id", "date", "shift_bits", "booked_bits")
+        return {
+            (staff_id, day): StaffAvailability.from_bits(shift_bits)
+            & ~StaffAvailability.from_bits(booked_bits)
+            for staff_id, day, shift_bits, booked_bits in rows
+        }
+
+    def free_windows(self, staff_ids, start_date, end_date):
+        """
+        Return {staff id: sorted (start, end) free windows} for a date range,
+        read from the bitmaps in one query.
+        """
+        windows = defaultdict(list)
+        masks = self.free_masks(staff_ids, start_date, end_date)
+        for (staff_id, day), mask in sorted(masks.items()):
+            windows[staff_id].extend(StaffAvailability.mask_windows(day, mask))
+        return windows
+
+    def available_staff(self, start, duration, staff_ids=None):
+        """
+        Return the ids of staff free for ``duration`` minutes from ``start``.
+        """
+        needed = dict(
+            StaffAvailability.range_masks(
+                start, start + timedelta(minutes=duration), covering=True
+            )
+        )
+        rows = self.filter(date__in=needed)
+        if staff_ids is not None:
+            rows = rows.filter(staff_id__in=staff_ids)
+
+        free_days = defaultdict(set)
+        for staff_id, day, shift_bits, booked_bits in rows.values_list(
+            "staff_id", "date", "shift_bits", "booked_bits"
+        ):
+            free = StaffAvailability.from_bits(
+                shift_bits
+            ) & ~StaffAvailability.from_bits(booked_bits)
+            if free & needed[day] == needed[day]:
+                free_days[staff_id].add(day)
+        return {
+            staff_id for staff_id, days in free_days.items() if len(days) == len(needed)
+        }
+
+
+class StaffAvailability(models.Model):
+    """
+    Per staff, per day availability bitmaps with one bit per 5-minute slot.
+
+    ``shift_bits`` marks slots covered by working ``StaffService`` shifts and
+    ``booked_bits`` slots taken by booked appointments. Both are kept current
+    on write, so reads never touch shifts or appointments.
+    """
+
+    SLOT_MINUTES = 5
+    SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+    BITMAP_BYTES = SLOTS_PER_DAY // 8
+
+    staff = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="availability_bitmaps"
+    )
+    date = models.DateField()
+    shift_bits = models.BinaryField(max_length=BITMAP_BYTES)
+    booked_bits = models.BinaryField(max_length=BITMAP_BYTES)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = StaffAvailabilityManager()
+
+    class Meta:
+        unique_together = ("staff", "date")
+        verbose_name_plural = "staff availability"
+
+    @classmethod
+    def to_bits(cls, mask):
+        return mask.to_bytes(cls.BITMAP_BYTES, "little")
+
+    @classmethod
+    def from_bits(cls, bits):
+        return int.from_bytes(bits, "little") if bits else 0
+
+    @staticmethod
+    def day_start(day):
+        return timezone.make_aware(datetime.combine(day, time.min))
+
+    @classmethod
+    def range_masks(cls, start, end, covering=False):
+        """
+        Yield (date, slot mask) for every day the range [start, end) touches.
+
+        With ``covering`` a slot is included when the range overlaps it at all
+        (bookings); otherwise only slots fully inside the range are (shifts).
+        """
+        slot = cls.SLOT_MINUTES * 60
+        day = timezone.localdate(start)
+        while start < end:
+            day_start = cls.day_start(day)
+            day_end = cls.day_start(day + timedelta(days=1))
+            first = (max(start, day_start) - day_start).total_seconds()
+            last = (min(end, day_end) - day_start).total_seconds()
+            if covering:
+                first, last = int(first // slot), -int(-last // slot)
+            else:
+                first, last = -int(-first // slot), int(last // slot)
+            if first < last:
+                yield day, ((1 << (last - first)) - 1) << first
+            start = day_end
+            day += timedelta(days=1)
+
+    @classmethod
+    def mask_windows(cls, day, mask):
+        """
+        Return the (start, end) datetimes of the runs of set slots in a mask.
+        """
+        slot = timedelta(minutes=cls.SLOT_MINUTES)
+        day_start = cls.day_start(day)
+        windows = []
+        index = 0
+        while mask:
+            # Skip to the next set slot, then past the end of its run
+            skip = (mask & -mask).bit_length() - 1
+            mask >>= skip
+            run = (~mask & (mask + 1)).bit_length() - 1
+            windows.append(
+                (
+                    day_start + (index + skip) * slot,
+                    day_start + (index + skip + run) * slot,
+                )
+            )
+            mask >>= run
+            index += skip + run
+        return windows
+
+    @classmethod
+    def days_touched(cls, staff_id, time_range):
+        if not time_range or staff_id is None:
+            return set()
+        return {
+            (staff_id, day)
+            for day, _ in cls.range_masks(
+                time_range.lower, time_range.upper, covering=True
+            )
+        }
+
+    @property
+    def free_mask(self):
+        return self.from_bits(self.shift_bits) & ~self.from_bits(self.booked_bits)
+
+    def is_free(self, start, duration):
+        """
+        Check whether every slot of [start, start + duration) on this day is free.
+        """
+        masks = dict(
+            self.range_masks(start, start + timedelta(minutes=duration), covering=True)
+        )
+        mask = masks.pop(self.date, 0)
+        return not masks and self.free_mask & mask == mask
+
+    def __str__(self):
+        return f"{self.staff} - {self.date}"
+
+
+@receiver(post_init, sender=StaffService)
+@receiver(post_init, sender=AppointmentStaff)
+def remember_availability_key(sender, instance, **kwargs):
+    # Remember what the row counted towards when it was loaded, turned into
+    # days only if it is saved; read through __dict__ so deferred fields are
+    # not fetched
+    values = instance.__dict__
+    if sender is StaffService:
+        instance._availability_key = (values.get("staff_id"), values.get("date"))
+    else:
+        instance._availability_key = (values.get("staff_id"), values.get("time_range"))
+
+
+@receiver(post_save, sender=StaffService)
+@receiver(post_delete, sender=StaffService)
+def refresh_availability_for_shift(sender, instance, **kwargs):
+    StaffAvailability.objects.refresh(
+        [instance._availability_key, (instance.staff_id, instance.date)]
+    )
+    instance._availability_key = (instance.staff_id, instance.date)
+
+
+@receiver(post_save, sender=AppointmentStaff)
+@receiver(post_delete, sender=AppointmentStaff)
+def refresh_availability_for_booking(sender, instance, **kwargs):
+    StaffAvailability.objects.refresh(
+        [
+            StaffAvailability.days_touched(*instance._availability_key),
+            StaffAvailability.days_touched(instance.staff_id, instance.time_range),
+        ]
+    )
+    instance._availability_key = (instance.staff_id, instance.time_range)
@@ -0,0 +1,277 @@
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db.models import Prefetch, prefetch_related_objects
+from django.utils import timezone
+
+from services.coupons import coupon_cache
+from services.models import Service
+
+CENT = Decimal("0.01")
+
+
+def pricing_prefetches():
+    """
+    Return the lookups needed to price appointments without further queries.
+    """
+    return [
+        Prefetch("services", queryset=Service.objects.select_related("coupon")),
+        "coupon",
+    ]
+
+
+def coupon_is_active(coupon, current_time):
+    """
+    Check whether a coupon's validity window contains the given time.
+
+    Naive datetimes are treated as being in the current timezone.
+    """
+    valid_from = coupon.valid_from
+    valid_until = coupon.valid_until
+
+    if valid_from and valid_from.tzinfo is None:
+        valid_from = timezone.make_aware(valid_from)
+
+    if valid_until and valid_until.tzinfo is None:
+        valid_until = timezone.make_aware(valid_until)
+
+    return valid_from <= current_time <= valid_until
+
+
+def quote(services, coupon=None, current_time=None):
+    """
+    Price a set of services in a single pass.
+
+    Args:
+        services (iterable): Services with their ``coupon`` already loaded
+        coupon (Coupon, optional): Coupon applied to the whole booking
+        current_time (datetime, optional): Time to check coupon validity at
+
+    Returns:
+        dict: ``total_price`` and the itemised ``breakdown``
+    """
+    current_time = current_time or timezone.now()
+    breakdown = {
+        "services": [],
+        "base_total": Decimal("0"),
+        "total_discount": Decimal("0"),
+        "final_total": Decimal("0"),
+        "applied_coupon": None,  # To show the coupon applied to the whole booking
+    }
+
+    for service in services:
+        service_detail = {
+            "name": service.service_name,
+            "price": service.price,
+            "discount": Decimal("0"),
+        }
+        if service.coupon and coupon_is_active(service.coupon, current_time):
+            service_detail["discount"] = (
+                service.price * service.coupon.discount / Decimal("100")
+            )
+            service_detail["coupon_code"] = service.coupon.coupon_code
+
+        breakdown["services"].append(service_detail)
+        breakdown["base_total"] += service.price
+        breakdown["total_discount"] += service_detail["discount"]
+
+    # The charged total only honours the booking-wide coupon, the breakdown
+    # also lists the discounts carried by individual services
+    booking_discount = Decimal("0")
+    if coupon and coupon_is_active(coupon, current_time):
+        booking_discount = breakdown["base_total"] * coupon.discount / Decimal("100")
+        breakdown["applied_coupon"] = coupon.coupon_code
+        breakdown["total_discount"] += booking_discount
+
+    breakdown["final_total"] = breakdown["base_total"] - breakdown["total_discount"]
+    return {
+        "total_price": max(breakdown["base_total"] - booking_discount, Decimal("0")),
+        "breakdown": breakdown,
+    }
+
+
+def cart_totals(services, coupon=None):
+    """
+    Totals of a cart before booking, with an optional booking-wide coupon.
+    """
+    base_total = sum((service.price for service in services), Decimal("0"))
+    totals = {
+        "base_total": base_total,
+        "final_total": base_total,
+        "discount_percentage": Decimal("0"),
+        "discount_amount": Decimal("0"),
+    }
+    if coupon is not None:
+        discount_amount = base_total * coupon.discount / Decimal("100")
+        totals.update(
+            final_total=base_total - discount_amount,
+            discount_percentage=coupon.discount,
+            discount_amount=discount_amount,
+            coupon_code=coupon.coupon_code,
+        )
+    return totals
+
+
+def quote_carts(carts, current_time=None):
+    """
+    Price many carts at once.
+
+    All referenced services are loaded with one query and all coupons with
+    at most one more (fewer when they are cached).
+
+    Args:
+        carts (list): Dicts with ``services`` (service ids, duplicates
+            counted once) and an optional ``coupon_code``
+        current_time (datetime, optional): Time to check coupon validity at
+
+    Returns:
+        list: One entry per cart, either its totals or an ``error`` message
+    """
+    current_time = current_time or timezone.now()
+    services = Service.objects.in_bulk(
+        {service_id for cart in carts for service_id in cart["services"]}
+    )
+    coupons = coupon_cache.get_many(
+        {cart["coupon_code"] for cart in carts if cart.get("coupon_code")},
+        current_time,
+    )
+
+    quotes = []
+    for cart in carts:
+        if not cart["services"] or any(
+            service_id not in services for service_id in cart["services"]
+        ):
+            quotes.append({"error": "Invalid services selected"})
+            continue
+
+        coupon = None
+        if cart.get("coupon_code"):
+            coupon = coupons[cart["coupon_code"]]
+            if not coupon_cache.is_valid(coupon, current_time):
+                quotes.append({"error": "Invalid or expired coupon code"})
+                continue
+
+        # A service is booked once however often it is listed, as the
+        # appointment's many-to-many relation keeps it once
+        quotes.append(
+            cart_totals(
+                [
+                    services[service_id]
+                    for service_id in dict.fromkeys(cart["services"])
+                ],
+                coupon,
+            )
+        )
+    return quotes
+
+
+def _cents(value):
+    return value.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def snapshot_fields(result, priced_at):
+    """
+    Map a price quote onto the appointment's price snapshot fields.
+    """
+    breakdown = result["breakdown"]
+    return {
+        "base_total": _cents(breakdown["base_total"]),
+        "discount_total": _cents(breakdown["total_discount"]),
+        "final_total": _cents(breakdown["final_total"]),
+        "total_price": _cents(result["total_price"]),
+        "applied_coupon_code": breakdown["applied_coupon"],
+        "price_lines": [
+            {
+                **line,
+                "price": _cents(line["price"]),
+                "discount": _cents(line["discount"]),
+            }
+            for line in breakdown["services"]
+        ],
+        "priced_at": priced_at,
+    }
+
+
+def _from_snapshot(appointment):
+    lines = [
+        {
+            **line,
+            "price": Decimal(line["price"]),
+            "discount": Decimal(line["discount"]),
+        }
+        for line in appointment.price_lines
+    ]
+    return {
+        "total_price": appointment.total_price,
+        "breakdown": {
+            "services": lines,
+            "base_total": appointment.base_total,
+            "total_discount": appointment.discount_total,
+            "final_total": appointment.final_total,
+            "applied_coupon": appointment.applied_coupon_code,
+        },
+    }
+
+
+def record_price(appointment, current_time=None):
+    """
+    Price an appointment from its current services and coupon and store the
+    result as its price snapshot.
+    """
+    forget_price(appointment)
+    current_time = current_time or timezone.now()
+    result = quote(appointment.services.all(), appointment.coupon, current_time)
+    fields = snapshot_fields(result, current_time)
+
+    # .update() so the snapshot does not re-trigger the save signals
+    type(appointment)._default_manager.filter(pk=appointment.pk).update(**fields)
+    for name, value in fields.items():
+        setattr(appointment, name, value)
+
+
+def price_appointment(appointment, current_time=None):
+    """
+    Return the price quote of an appointment.
+
+    Appointments with a price snapshot are read from it. Others are priced
+    from their prefetched services when available, keeping the result on the
+    instance so the total and the breakdown share one pass.
+    """
+    if appointment.priced_at is not None:
+        return _from_snapshot(appointment)
+
+    cached = appointment.__dict__.get("_price_quote")
+    if cached is not None and cached[0] == appointment.coupon_id:
+        return cached[1]
+
+    result = quote(appointment.services.all(), appointment.coupon, current_time)
+    appointment._price_quote = (appointment.coupon_id, result)
+    return result
+
+
+def price_appointments(appointments, current_time=None):
+    """
+    Price a list of appointments with a fixed number of queries.
+
+    Snapshotted appointments need no queries; for the rest, services (with
+    their coupons) and coupons are fetched in bulk unless already prefetched.
+
+    Returns:
+        dict: Price quotes keyed by appointment id
+    """
+    appointments = list(appointments)
+    prefetch_related_objects(
+        [appointment for appointment in appointments if appointment.priced_at is None],
+        *pricing_prefetches(),
+    )
+    current_time = current_time or timezone.now()
+    return {
+        appointment.pk: price_appointment(appointment, current_time)
+        for appointment in appointments
+    }
+
+
+def forget_price(appointment):
+    """
+    Drop the price quote kept on an appointment instance.
+    """
+    appointment.__dict__.pop("_price_quote", None)
@@ -0,0 +1,180 @@
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import datetime, timedelta
+from itertools import permutations
+from time import monotonic
+
+from django.utils import timezone
+
+from services.models import StaffService
+
+from .models import StaffAvailability
+from .utils import _intersect, _merge, day_bounds
+
+# Reordering is only explored for small bookings to keep the search bounded
+MAX_REORDERED_SERVICES = 4
+
+
+class ChainSolver:
+    """
+    Bounded search for back-to-back sequences of services on a single day.
+
+    Each service in the chain may be performed by a different staff member;
+    a step is feasible when the staff member has a "working" shift for that
+    service covering the step and no booking overlapping it. Shifts and the
+    availability bitmaps are loaded with two queries, after which the search
+    runs entirely in memory.
+    """
+
+    def __init__(self, services, day, step=15, now=None):
+        self.services = list(services)
+        self.day = day
+        self.step = timedelta(minutes=step)
+        self.not_before = now or timezone.now()
+        self._free = self._load_free_windows()
+        # (order, index, start) suffixes already known to be infeasible
+        self._dead_ends = set()
+
+    def _load_free_windows(self):
+        shifts = defaultdict(lambda: defaultdict(list))
+        rows = StaffService.objects.filter(
+            service__in=self.services,
+            status="working",
+            date=self.day,
+            start_time__isnull=False,
+            end_time__isnull=False,
+        ).values_list("service_id", "staff_id", "start_time", "end_time")
+        for service_id, staff_id, start_time, end_time in rows:
+            start = timezone.make_aware(datetime.combine(self.day, start_time))
+            end = timezone.make_aware(datetime.combine(self.day, end_time))
+            if start < end:
+                shifts[service_id][staff_id].append((start, end))
+
+        staff_ids = {
+            staff_id for per_staff in shifts.values() for staff_id in per_staff
+        }
+        available = StaffAvailability.objects.free_windows(
+            staff_ids, self.day, self.day
+        )
+
+        # service id -> staff id -> (window starts, window ends)
+        free = {}
+        for service_id, per_staff in shifts.items():
+            free[service_id] = {}
+            for staff_id, windows in per_staff.items():
+                windows = _intersect(_merge(windows), available[staff_id])
+                if windows:
+                    free[service_id][staff_id] = (
+                        [start for start, _ in windows],
+                        [end for _, end in windows],
+                    )
+        return free
+
+    def _is_free(self, service_id, staff_id, start, end):
+        starts, ends = self._free[service_id][staff_id]
+        i = bisect_right(starts, start) - 1
+        return i >= 0 and ends[i] >= end
+
+    def _chain(self, order, index, start, previous_staff, deadline):
+        """
+        Depth-first search for the rest of a chain, preferring to keep the
+        same staff member between consecutive services.
+        """
+        if index == len(order):
+            return []
+        if monotonic() > deadline:
+            raise TimeoutError
+
+        if (order, index, start) in self._dead_ends:
+            return None
+
+        service = order[index]
+        end = start + timedelta(minutes=service.duration)
+        candidates = sorted(
+            self._free.get(service.pk, {}),
+            key=lambda staff_id: (staff_id != previous_staff, staff_id),
+        )
+        for staff_id in candidates:
+            if not self._is_free(service.pk, staff_id, start, end):
+                continue
+            rest = self._chain(order, index + 1, end, staff_id, deadline)
+            if rest is not None:
+                return [
+                    {
+                        "service_id": service.pk,
+                        "staff_id": staff_id,
+                        "start": start,
+                        "end": end,
+                    }
+                ] + rest
+        self._dead_ends.add((order, index, start))
+        return None
+
+    def _orders(self, keep_order):
+        if keep_order or len(self.services) > MAX_REORDERED_SERVICES:
+            return [tuple(self.services)]
+        return list(dict.fromkeys(permutations(self.services)))
+
+    def _start_times(self):
+        start, end = day_bounds(self.day)
+        windows = [
+            (starts[0], ends[-1])
+            for per_staff in self._free.values()
+            for starts, ends in per_staff.values()
+        ]
+        if not windows:
+            return
+        first = max(start, min(window[0] for window in windows))
+        last = min(end, max(window[1] for window in windows))
+
+        # Align to the slot grid and skip times already in the past
+        first = start + self.step * -(-(first - start) // self.step)
+        while first < self.not_before:
+            first += self.step
+        while first < last:
+            yield first
+            first += self.step
+
+    def solve(self, top_k=5, time_limit=0.08, keep_order=True):
+        """
+        Return up to ``top_k`` chained options ordered by start time.
+
+        Args:
+            top_k (int): Maximum number of options to return
+            time_limit (float): Search budget in seconds
+            keep_order (bool): Perform services in the given order only
+
+        Returns:
+            tuple: (list of options, whether the search ran out of time)
+        """
+        deadline = monotonic() + time_limit
+        orders = self._orders(keep_order)
+        if any(service.pk not in self._free for service in self.services):
+            return [], False
+
+        options = []
+        try:
+            for start in self._start_times():
+                best = None
+                for order in orders:
+                    steps = self._chain(order, 0, start, None, deadline)
+                    if steps is None:
+                        continue
+                    staff_count = len({step["staff_id"] for step in steps})
+                    if best is None or staff_count < best[0]:
+                        best = (staff_count, steps)
+                    if staff_count == 1:
+                        break
+                if best is not None:
+                    options.append(
+                        {
+                            "start": best[1][0]["start"],
+                            "end": best[1][-1]["end"],
+                            "steps": best[1],
+                        }
+                    )
+                    if len(options) >= top_k:
+                        break
+        except TimeoutError:
+            return options, True
+        return options, False
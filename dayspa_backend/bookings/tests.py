@@ -1,3 +1,187 @@
-from django.test import TestCase
+import threading
+import time
+from datetime import date, timedelta
+from datetime import time as clock
+from decimal import Decimal
+from importlib import import_module
+from io import StringIO
 
-# Create your tests here.
+from django.apps import apps
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from accounts.models import User
+from bookings.models import Appointment, StaffAvailability
+from bookings.utils import book_appointment, day_bounds, find_free_slots
+from services.models import Coupon, Service, StaffService
+
+
+class AvailabilityBitmapTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(
+            email="customer@example.com", password="password"
+        )
+        self.staff = User.objects.create_user(
+            email="staff@example.com", password="password"
+        )
+        self.service = Service.objects.create(
+            service_name="Massage",
+            description="Test service",
+            duration=60,
+            price=Decimal("50.00"),
+        )
+        self.day = date(2030, 1, 1)
+        StaffService.objects.create(
+            staff=self.staff,
+            service=self.service,
+            date=self.day,
+            start_time=clock(9),
+            end_time=clock(12),
+            status="working",
+        )
+        self.day_start = day_bounds(self.day)[0]
+
+    def at(self, hour, minute=0):
+        return self.day_start + timedelta(hours=hour, minutes=minute)
+
+    def test_mask_windows_round_trip(self):
+        start, end = self.at(9, 30), self.at(11, 15)
+        ((day, mask),) = StaffAvailability.range_masks(start, end)
+        self.assertEqual(
+            StaffAvailability.mask_windows(day, mask | 1),
+            [(self.at(0), self.at(0, 5)), (start, end)],
+        )
+
+    def test_slot_search_reads_bookings_from_bitmaps(self):
+        book_appointment(self.customer, self.staff, [self.service], self.at(10))
+        slots = find_free_slots(
+            [self.service], self.day, self.day, 10, now=self.day_start
+        )
+        self.assertEqual([slot["start"] for slot in slots], [self.at(9), self.at(11)])
+
+        # The search trusts the bitmaps: rows written behind the signals'
+        # back are not seen until the bitmaps are refreshed
+        StaffService.objects.filter(staff=self.staff).update(end_time=clock(13))
+        self.assertEqual(
+            len(
+                find_free_slots(
+                    [self.service], self.day, self.day, 10, now=self.day_start
+                )
+            ),
+            2,
+        )
+        StaffAvailability.objects.refresh([(self.staff.pk, self.day)])
+        slots = find_free_slots(
+            [self.service], self.day, self.day, 10, now=self.day_start
+        )
+        self.assertEqual(slots[-1]["start"], self.at(12))
+
+    def test_backfill_matches_refresh(self):
+        book_appointment(self.customer, self.staff, [self.service], self.at(10))
+        expected = list(
+            StaffAvailability.objects.values_list(
+                "staff_id", "date", "shift_bits", "booked_bits"
+            )
+        )
+        StaffAvailability.objects.all().delete()
+
+        migration = import_module("bookings.migrations.0011_staffavailability")
+        migration.backfill_availability(apps, connection.schema_editor())
+        self.assertEqual(
+            list(
+                StaffAvailability.objects.values_list(
+                    "staff_id", "date", "shift_bits", "booked_bits"
+                )
+            ),
+            expected,
+        )
+
+
+class ConcurrentAvailabilityTests(TransactionTestCase):
+    def test_concurrent_bookings_are_both_recorded(self):
+        customer = User.objects.create_user(
+            email="customer@example.com", password="password"
+        )
+        staff = User.objects.create_user(email="staff@example.com", password="password")
+        service = Service.objects.create(
+            service_name="Massage",
+            description="Test service",
+            duration=60,
+            price=Decimal("50.00"),
+        )
+        day = date(2030, 1, 1)
+        StaffService.objects.create(
+            staff=staff,
+            service=service,
+            date=day,
+            start_time=clock(9),
+            end_time=clock(12),
+            status="working",
+        )
+        day_start = day_bounds(day)[0]
+
+        def other_booking():
+            try:
+                book_appointment(
+                    customer, staff, [service], day_start + timedelta(hours=11)
+                )
+            finally:
+                connection.close()
+
+        # The second refresh waits for the first booking to commit, then
+        # sees it instead of overwriting its bits
+        with transaction.atomic():
+            book_appointment(customer, staff, [service], day_start + timedelta(hours=9))
+            thread = threading.Thread(target=other_booking)
+            thread.start()
+            time.sleep(0.3)
+        thread.join()
+
+        bitmap = StaffAvailability.objects.get(staff=staff, date=day)
+        ((_, booked),) = StaffAvailability.range_masks(
+            day_start + timedelta(hours=9), day_start + timedelta(hours=12)
+        )
+        ((_, free),) = StaffAvailability.range_masks(
+            day_start + timedelta(hours=10), day_start + timedelta(hours=11)
+        )
+        self.assertEqual(
+            StaffAvailability.from_bits(bitmap.booked_bits), booked & ~free
+        )
+
+
+class SnapshotAppointmentPricesTests(TestCase):
+    def test_coupon_is_checked_when_the_appointment_was_booked(self):
+        now = timezone.now()
+        coupon = Coupon.objects.create(
+            coupon_code="SPRING",
+            discount=Decimal("10"),
+            valid_from=now - timedelta(days=30),
+            valid_until=now - timedelta(days=1),
+        )
+        appointment = Appointment.objects.create(
+            user=User.objects.create_user(email="customer@example.com", password="x"),
+            appointment_time=now + timedelta(days=1),
+            coupon=coupon,
+        )
+        appointment.services.set(
+            [
+                Service.objects.create(
+                    service_name="Massage",
+                    description="Test service",
+                    duration=60,
+                    price=Decimal("50.00"),
+                )
+            ]
+        )
+        booked_at = now - timedelta(days=7)
+        Appointment.objects.filter(pk=appointment.pk).update(
+            created_at=booked_at, priced_at=None
+        )
+
+        call_command("snapshot_appointment_prices", stdout=StringIO())
+        appointment.refresh_from_db()
+        self.assertEqual(appointment.total_price, Decimal("45.00"))
+        self.assertEqual(appointment.applied_coupon_code, "SPRING")
+        self.assertEqual(appointment.priced_at, booked_at)
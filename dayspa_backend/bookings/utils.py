@@ -1,9 +1,174 @@
-from django.db.models import Q
-from datetime import timedelta
-from .models import Appointment
+import heapq
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+from itertools import groupby
 
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Exists, OuterRef, Q
+from django.utils import timezone
 
-def is_time_slot_available(staff, appointment_time, duration):
+from accounts.models import User
+from services.models import StaffService
+
+from .models import Appointment, AppointmentStaff, StaffAvailability
+
+# SQLSTATE raised when a row violates an exclusion constraint
+EXCLUSION_VIOLATION = "23P01"
+
+
+class SlotUnavailableError(ValueError):
+    """
+    Raised when a booking overlaps another booking of the same staff member.
+    """
+
+
+def is_booking_conflict(error):
+    """
+    Check whether an IntegrityError was raised by the no-double-booking constraint.
+    """
+    cause = error.__cause__
+    code = getattr(cause, "pgcode", None) or getattr(cause, "sqlstate", None)
+    return code == EXCLUSION_VIOLATION
+
+
+@contextmanager
+def booking_conflicts():
+    """
+    Run a block atomically, turning double-booking violations into SlotUnavailableError.
+    """
+    try:
+        with transaction.atomic():
+            yield
+    except IntegrityError as e:
+        if is_booking_conflict(e):
+            raise SlotUnavailableError("Selected time slot is not available") from e
+        raise
+
+
+def day_bounds(day):
+    """
+    Return the timezone-aware [start, end) datetimes covering a calendar day.
+    """
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+class IntervalIndex:
+    """
+    Sorted, non-overlapping busy intervals for a single staff member.
+
+    Overlapping bookings are merged on insert, so an overlap check is a
+    single bisect over the start times.
+    """
+
+    def __init__(self, intervals=()):
+        self._starts = []
+        self._ends = []
+        for start, end in sorted(intervals):
+            self._append(start, end)
+
+    def _append(self, start, end):
+        if self._ends and start <= self._ends[-1]:
+            self._ends[-1] = max(self._ends[-1], end)
+        else:
+            self._starts.append(start)
+            self._ends.append(end)
+
+    def add(self, start, end):
+        """
+        Insert a busy interval, merging it with any neighbours it touches.
+        """
+        if start >= end:
+            return
+        lo = bisect_left(self._ends, start)
+        hi = bisect_right(self._starts, end)
+        if lo < hi:
+            start = min(start, self._starts[lo])
+            end = max(end, self._ends[hi - 1])
+        self._starts[lo:hi] = [start]
+        self._ends[lo:hi] = [end]
+
+    def overlaps(self, start, end):
+        """
+        Check whether [start, end) intersects any busy interval.
+        """
+        i = bisect_right(self._starts, start) - 1
+        if i >= 0 and self._ends[i] > start:
+            return True
+        return i + 1 < len(self._starts) and self._starts[i + 1] < end
+
+    def __iter__(self):
+        return zip(self._starts, self._ends)
+
+    def __len__(self):
+        return len(self._starts)
+
+
+class AvailabilityIndex:
+    """
+    Busy intervals for a set of staff members within a time window.
+
+    Built from a single query over the ``time_range`` column of
+    ``AppointmentStaff``, which only holds a range while the appointment
+    blocks the staff member's calendar.
+    """
+
+    def __init__(self, window_start, window_end, intervals=None):
+        self.window_start = window_start
+        self.window_end = window_end
+        self._indexes = defaultdict(IntervalIndex)
+        for staff_id, staff_intervals in (intervals or {}).items():
+            self._indexes[staff_id] = IntervalIndex(staff_intervals)
+
+    @classmethod
+    def load(cls, staff_ids, window_start, window_end, exclude_appointment=None):
+        """
+        Load the busy intervals of ``staff_ids`` overlapping [window_start, window_end).
+        """
+        bookings = AppointmentStaff.objects.filter(
+            staff_id__in=staff_ids, time_range__overlap=(window_start, window_end)
+        )
+        if exclude_appointment is not None:
+            bookings = bookings.exclude(appointment_id=exclude_appointment)
+
+        intervals = defaultdict(list)
+        for staff_id, time_range in bookings.values_list("staff_id", "time_range"):
+            intervals[staff_id].append((time_range.lower, time_range.upper))
+
+        return cls(window_start, window_end, intervals)
+
+    @classmethod
+    def for_day(cls, staff_ids, day):
+        """
+        Load the busy intervals of ``staff_ids`` on a calendar day.
+        """
+        return cls.load(staff_ids, *day_bounds(day))
+
+    def covers(self, start, end):
+        return self.window_start <= start and end <= self.window_end
+
+    def for_staff(self, staff_id):
+        return self._indexes[staff_id]
+
+    def is_available(self, staff_id, start, duration):
+        """
+        Check whether ``staff_id`` is free for ``duration`` minutes from ``start``.
+        """
+        end = start + timedelta(minutes=duration)
+        if not self.covers(start, end):
+            raise ValueError("Requested slot falls outside the loaded window")
+        return not self._indexes[staff_id].overlaps(start, end)
+
+    def book(self, staff_id, start, duration):
+        """
+        Record a new booking so later checks against this index see it.
+        """
+        self._indexes[staff_id].add(start, start + timedelta(minutes=duration))
+
+
+def is_time_slot_available(staff, appointment_time, duration, index=None):
     """
     Check if a time slot is available for a specific staff member.
 
@@ -11,28 +176,229 @@ def is_time_slot_available(staff, appointment_time, duration):
         staff (User): Staff member to check availability for
         appointment_time (datetime): Proposed appointment start time
         duration (int): Total duration of services in minutes
+        index (AvailabilityIndex): Preloaded index to check against (optional)
 
     Returns:
         bool: True if slot is available, False otherwise
     """
-    conflicting_appointments = Appointment.objects.filter(
-        staff=staff, status__in=["confirmed", "in_progress"]
-    ).filter(
-        Q(
-            # New appointment starts during an existing appointment
-            appointment_time__range=(
-                appointment_time,
-                appointment_time + timedelta(minutes=duration),
+    end = appointment_time + timedelta(minutes=duration)
+    if index is None or not index.covers(appointment_time, end):
+        index = AvailabilityIndex.load([staff.pk], appointment_time, end)
+
+    return index.is_available(staff.pk, appointment_time, duration)
+
+
+def _merge(intervals):
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [tuple(interval) for interval in merged]
+
+
+def _intersect(left, right):
+    result = []
+    i = j = 0
+    while i < len(left) and j < len(right):
+        start = max(left[i][0], right[j][0])
+        end = min(left[i][1], right[j][1])
+        if start < end:
+            result.append((start, end))
+        if left[i][1] < right[j][1]:
+            i += 1
+        else:
+            j += 1
+    return result
+
+
+def qualified_shifts(services, start_date, end_date):
+    """
+    Return the shift windows in which each staff member can perform all of ``services``.
+
+    Windows come from "working" ``StaffService`` rows; a staff member
+    qualifies for a stretch of time only if every requested service is
+    covered by one of their shifts. Loaded with a single query.
+
+    Returns:
+        dict: staff id -> sorted list of (start, end) datetimes
+    """
+    service_ids = {service.pk for service in services}
+    rows = StaffService.objects.filter(
+        service_id__in=service_ids,
+        status="working",
+        date__range=(start_date, end_date),
+        start_time__isnull=False,
+        end_time__isnull=False,
+    ).values_list("staff_id", "service_id", "date", "start_time", "end_time")
+
+    windows = defaultdict(lambda: defaultdict(list))
+    for staff_id, service_id, day, start_time, end_time in rows:
+        start = timezone.make_aware(datetime.combine(day, start_time))
+        end = timezone.make_aware(datetime.combine(day, end_time))
+        if start < end:
+            windows[staff_id][service_id].append((start, end))
+
+    shifts = {}
+    for staff_id, per_service in windows.items():
+        if set(per_service) != service_ids:
+            continue
+        covered = None
+        for service_windows in per_service.values():
+            service_windows = _merge(service_windows)
+            covered = (
+                service_windows
+                if covered is None
+                else _intersect(covered, service_windows)
             )
+        if covered:
+            shifts[staff_id] = covered
+    return shifts
+
+
+def _slot_starts(staff_id, free_windows, duration, step, not_before):
+    step_seconds = step.total_seconds()
+    for start, end in free_windows:
+        start = max(start, not_before)
+        # Align candidate start times to the slot grid
+        offset = (start - day_bounds(timezone.localdate(start))[0]).total_seconds()
+        remainder = offset % step_seconds
+        if remainder:
+            start += timedelta(seconds=step_seconds - remainder)
+        while start + duration <= end:
+            yield start, staff_id
+            start += step
+
+
+def find_free_slots(services, start_date, end_date, limit, step=15, now=None):
+    """
+    Find the earliest free start times for ``services`` across all qualified staff.
+
+    Shift windows are loaded in one query and free time in another, from
+    the availability bitmaps (shift slots AND NOT booked slots); the search
+    itself is an in-memory sweep over every staff member's free windows
+    merged by start time.
+
+    Args:
+        services (list): Services to be performed back to back
+        start_date (date): First day to search
+        end_date (date): Last day to search (inclusive)
+        limit (int): Maximum number of start times to return
+        step (int): Slot granularity in minutes
+        now (datetime): Earliest acceptable start time (defaults to now)
+
+    Returns:
+        list: Dicts with ``start``, ``end`` and the ``staff_ids`` free at that time
+    """
+    duration = timedelta(minutes=sum(service.duration for service in services))
+    step = timedelta(minutes=step)
+    not_before = now or timezone.now()
+
+    shifts = qualified_shifts(services, start_date, end_date)
+    if not shifts or not duration:
+        return []
+
+    free = StaffAvailability.objects.free_windows(list(shifts), start_date, end_date)
+
+    candidates = heapq.merge(
+        *(
+            _slot_starts(
+                staff_id,
+                _intersect(windows, free[staff_id]),
+                duration,
+                step,
+                not_before,
+            )
+            for staff_id, windows in shifts.items()
+        )
+    )
+
+    slots = []
+    for start, group in groupby(candidates, key=lambda candidate: candidate[0]):
+        slots.append(
+            {
+                "start": start,
+                "end": start + duration,
+                "staff_ids": sorted(staff_id for _, staff_id in group),
+            }
+        )
+        if len(slots) >= limit:
+            break
+    return slots
+
+
+def assign_staff(appointment, services):
+    """
+    Assign the least busy qualified staff member to a newly booked appointment.
+
+    Candidates are staff with "working" shifts covering every service for the
+    whole appointment. Those with a conflicting booking are dropped using
+    the availability bitmaps, and a single aggregated query ranks the rest
+    by the number of bookings they already have that day, preferring
+    primary staff on ties.
+
+    Args:
+        appointment (Appointment): Appointment with its services already set
+        services (list): The appointment's services
+
+    Raises:
+        SlotUnavailableError: If every qualified staff member is busy
+
+    Returns:
+        AppointmentStaff: The assignment, or None when nobody is qualified
+    """
+    duration = sum(service.duration for service in services)
+    time_range = appointment.booking_range(duration)
+    if time_range is None:
+        return None
+
+    start, end = time_range.lower, time_range.upper
+    day = timezone.localdate(start)
+    candidates = [
+        staff_id
+        for staff_id, windows in qualified_shifts(services, day, day).items()
+        if any(
+            shift_start <= start and end <= shift_end
+            for shift_start, shift_end in windows
         )
-        | Q(
-            # Existing appointment overlaps with new appointment
-            appointment_time__lte=appointment_time,
-            appointment_time__gt=(appointment_time - timedelta(minutes=duration)),
+    ]
+    if not candidates:
+        return None
+    available = StaffAvailability.objects.available_staff(start, duration, candidates)
+
+    ranked = (
+        User.objects.filter(pk__in=available)
+        .annotate(
+            workload=Count(
+                "assigned_appointments",
+                filter=Q(assigned_appointments__time_range__overlap=day_bounds(day)),
+            ),
+            is_primary=Exists(
+                StaffService.objects.filter(
+                    staff=OuterRef("pk"),
+                    service__in=services,
+                    date=day,
+                    is_primary=True,
+                )
+            ),
         )
+        .order_by("workload", "-is_primary", "pk")
+        .values_list("pk", flat=True)
     )
 
-    return not conflicting_appointments.exists()
+    for staff_id in ranked:
+        # Another booking may have claimed this staff member since the query
+        try:
+            with transaction.atomic():
+                return AppointmentStaff.objects.create(
+                    appointment=appointment, staff_id=staff_id, time_range=time_range
+                )
+        except IntegrityError as e:
+            if not is_booking_conflict(e):
+                raise
+
+    raise SlotUnavailableError("Selected time slot is not available")
 
 
 def book_appointment(customer, staff, services, appointment_time):
@@ -46,7 +412,7 @@ def book_appointment(customer, staff, services, appointment_time):
         appointment_time (datetime): Proposed appointment time
 
     Raises:
-        ValueError: If time slot is not available
+        SlotUnavailableError: If time slot is not available
 
     Returns:
         Appointment: Created appointment object
@@ -56,17 +422,26 @@ def book_appointment(customer, staff, services, appointment_time):
 
     # Check staff availability
     if not is_time_slot_available(staff, appointment_time, total_duration):
-        raise ValueError("Selected time slot is not available")
-
-    # Create appointment
-    appointment = Appointment.objects.create(
-        user=customer,
-        staff=staff,
-        appointment_time=appointment_time,
-        status="confirmed",
-    )
+        raise SlotUnavailableError("Selected time slot is not available")
+
+    # The exclusion constraint on AppointmentStaff rejects any booking that
+    # raced past the check above
+    with booking_conflicts():
+        # Create appointment
+        appointment = Appointment.objects.create(
+            user=customer,
+            appointment_time=appointment_time,
+            status="confirmed",
+        )
+
+        # Add services to appointment
+        appointment.services.add(*services)
 
-    # Add services to appointment
-    appointment.services.add(*services)
+        # Assign the staff member
+        AppointmentStaff.objects.create(
+            appointment=appointment,
+            staff=staff,
+            time_range=appointment.booking_range(total_duration),
+        )
 
     return appointment
@@ -22,7 +22,14 @@ import paypalrestsdk
 BASE_DIR = Path(__file__).resolve().parent.parent
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        # request.user comes from the access token's claims, see
+        # api.authentication
+        "api.authentication.ClaimsJWTAuthentication",
+    ),
+    "DEFAULT_RENDERER_CLASSES": (
+        # Uses orjson when installed, otherwise behaves like JSONRenderer
+        "api.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
     ),
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
@@ -90,12 +97,19 @@ LOGGING = {
             "level": "DEBUG",  # Only DEBUG-level logs for this logger
             "propagate": False,  # Prevent propagation to other loggers
         },
+        "jobs": {  # Background job workers, including failed job tracebacks
+            "handlers": ["console", "file"],
+            "level": "INFO",
+            "propagate": False,
+        },
     },
 }
 # JWT settings
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(hours=1),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
+    "TOKEN_OBTAIN_SERIALIZER": "api.authentication.ClaimsTokenObtainPairSerializer",
+    "TOKEN_USER_CLASS": "api.authentication.ClaimsUser",
 }
 
 # Quick-start development settings - unsuitable for production
@@ -111,7 +125,7 @@ ALLOWED_HOSTS = ["*"]
 AUTH_USER_MODEL = "accounts.User"
 
 
-EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
+EMAIL_BACKEND = "api.mail.PooledEmailBackend"
 EMAIL_HOST = "smtp.gmail.com"  # Use your SMTP server
 EMAIL_PORT = 465
 EMAIL_USE_SSL = True
@@ -119,6 +133,13 @@ EMAIL_HOST_USER = config("EMAIL_HOST_USER")
 EMAIL_HOST_PASSWORD = config("EMAIL_HOST_PASSWORD")
 DEFAULT_FROM_EMAIL = config("DEFAULT_FROM_EMAIL")
 
+# Authenticated SMTP connections kept open per process, and how many
+# messages each sends before reconnecting
+EMAIL_POOL_SIZE = config("EMAIL_POOL_SIZE", default=4, cast=int)
+EMAIL_POOL_MAX_MESSAGES = config("EMAIL_POOL_MAX_MESSAGES", default=100, cast=int)
+EMAIL_POOL_IDLE_TIMEOUT = config("EMAIL_POOL_IDLE_TIMEOUT", default=60, cast=int)
+EMAIL_POOL_TIMEOUT = config("EMAIL_POOL_TIMEOUT", default=30, cast=int)
+
 
 # Application definition
 
@@ -136,10 +157,12 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "api",
     "services",
     "bookings",
     "accounts",
+    "jobs",
     "rest_framework",
     "rest_framework_simplejwt",
     "corsheaders",
@@ -192,6 +215,42 @@ PAYPAL_CANCEL_URL = config(
     "PAYPAL_CANCEL_URL", default="http://localhost:3000/payment/cancel"
 )  # PayPal SDK Configuration
 
+# Seconds a coupon lookup is cached per process (unknown codes: negative TTL)
+COUPON_CACHE_TTL = config("COUPON_CACHE_TTL", default=60, cast=int)
+COUPON_CACHE_NEGATIVE_TTL = config("COUPON_CACHE_NEGATIVE_TTL", default=30, cast=int)
+
+# Google ID tokens are verified locally against these published signing keys,
+# re-fetched as their cache headers say (timeout in seconds)
+GOOGLE_CERTS_URL = config(
+    "GOOGLE_CERTS_URL", default="https://www.googleapis.com/oauth2/v3/certs"
+)
+GOOGLE_CERTS_TIMEOUT = config("GOOGLE_CERTS_TIMEOUT", default=5, cast=int)
+
+# Background jobs (manage.py run_jobs): seconds an idle worker waits between
+# polls, base and cap of the retry backoff, and after how long a job whose
+# worker stopped reporting is run again (running jobs report every quarter
+# of that)
+JOBS_POLL_INTERVAL = config("JOBS_POLL_INTERVAL", default=1, cast=float)
+JOBS_RETRY_BACKOFF = config("JOBS_RETRY_BACKOFF", default=30, cast=int)
+JOBS_MAX_BACKOFF = config("JOBS_MAX_BACKOFF", default=3600, cast=int)
+JOBS_LOCK_TIMEOUT = config("JOBS_LOCK_TIMEOUT", default=600, cast=int)
+
+# Invoice PDFs are rendered by a pool of warm WeasyPrint processes in each
+# job worker process (requests only queue renders): pool size, documents
+# queued or rendering at once, and seconds before a render (or a wait) is
+# given up
+PDF_RENDER_WORKERS = config("PDF_RENDER_WORKERS", default=2, cast=int)
+PDF_RENDER_MAX_PENDING = config("PDF_RENDER_MAX_PENDING", default=8, cast=int)
+PDF_RENDER_TIMEOUT = config("PDF_RENDER_TIMEOUT", default=30, cast=int)
+
+# Seconds a user loaded for a request is cached per process (saves drop it)
+USER_CACHE_TTL = config("USER_CACHE_TTL", default=30, cast=int)
+
+# Seconds a cached service catalog response is kept. Responses are keyed by
+# the catalog version stored in the database, so edits are never served
+# stale, whichever process caches the response
+CATALOG_CACHE_TIMEOUT = config("CATALOG_CACHE_TIMEOUT", default=300, cast=int)
+
 paypalrestsdk.configure(
     {
         "mode": PAYPAL_MODE,  # sandbox or live
@@ -250,6 +309,13 @@ STATIC_URL = "static/"
 
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
+
+# Generated invoice PDFs hold customer details, so they are kept outside
+# MEDIA_ROOT and only served by the authenticated invoice download
+INVOICE_ROOT = config(
+    "INVOICE_ROOT", default=os.path.join(BASE_DIR, "private", "invoices")
+)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
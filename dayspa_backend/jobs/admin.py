@@ -0,0 +1,25 @@
+from django.contrib import admin
+from django.utils import timezone
+from unfold.admin import ModelAdmin
+
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(ModelAdmin):
+    list_display = ("id", "task", "status", "attempts", "run_at", "finished_at")
+    list_filter = ("status", "task")
+    search_fields = ("task",)
+    readonly_fields = ("created_at", "finished_at", "locked_at", "last_error")
+    actions = ["retry_jobs"]
+
+    @admin.action(description="Run selected jobs again")
+    def retry_jobs(self, request, queryset):
+        updated = queryset.exclude(status=Job.RUNNING).update(
+            status=Job.QUEUED,
+            attempts=0,
+            run_at=timezone.now(),
+            locked_at=None,
+            finished_at=None,
+        )
+        self.message_user(request, f"{updated} jobs queued again.")
@@ -0,0 +1,50 @@
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from jobs.worker import run_workers
+
+
+class Command(BaseCommand):
+    help = (
+        "Run queued jobs (invoices, emails) until interrupted. Several "
+        "processes can run side by side, each job is taken once."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency", type=int, default=1, help="Worker threads to run"
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=getattr(settings, "JOBS_POLL_INTERVAL", 1),
+            help="Seconds to wait when no job is due",
+        )
+        parser.add_argument(
+            "--burst",
+            action="store_true",
+            help="Exit once no job is due instead of waiting for more",
+        )
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+
+        def shutdown(signum, frame):
+            # Let running jobs finish, then exit
+            self.stdout.write("Stopping after the current jobs...")
+            stop.set()
+
+        signal.signal(signal.SIGINT, shutdown)
+        signal.signal(signal.SIGTERM, shutdown)
+
+        self.stdout.write(f"Running jobs with {options['concurrency']} workers")
+        performed = run_workers(
+            concurrency=options["concurrency"],
+            poll_interval=options["poll_interval"],
+            burst=options["burst"],
+            stop=stop,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Ran {performed} jobs"))
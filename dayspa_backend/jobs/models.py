@@ -0,0 +1,61 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+
+class JobQuerySet(models.QuerySet):
+    def ready(self, current_time, lock_timeout):
+        """
+        Jobs a worker may take: queued ones that are due, and running ones
+        whose worker has not reported back within ``lock_timeout`` (it most
+        likely died).
+        """
+        return self.filter(
+            Q(status=Job.QUEUED, run_at__lte=current_time)
+            | Q(status=Job.RUNNING, locked_at__lt=current_time - lock_timeout)
+        )
+
+
+class Job(models.Model):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    DEAD = "dead"
+    STATUS_CHOICES = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (DEAD, "Dead"),  # Out of attempts, kept for inspection and retry
+    ]
+
+    task = models.CharField(max_length=255)
+    payload = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    objects = JobQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Only unfinished jobs are polled, keep the index to those
+            models.Index(
+                fields=["run_at"],
+                name="job_queued_idx",
+                condition=Q(status="queued"),
+            ),
+            models.Index(
+                fields=["locked_at"],
+                name="job_running_idx",
+                condition=Q(status="running"),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.task} #{self.pk} ({self.status})"
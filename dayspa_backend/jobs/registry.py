@@ -0,0 +1,57 @@
+from .models import Job
+
+_tasks = {}
+
+
+def task(name=None, max_attempts=5):
+    """
+    Register a function as a job task.
+
+    The function is called with the job's payload as keyword arguments and
+    gains an ``enqueue(**payload)`` helper. Payloads must be JSON
+    serialisable, so pass ids rather than model instances.
+
+    Args:
+        name (str, optional): Task name stored on jobs, defaults to
+            ``<module>.<function>``
+        max_attempts (int): Runs before a failing job is dead-lettered
+    """
+
+    def register(func):
+        task_name = name or f"{func.__module__}.{func.__qualname__}"
+        _tasks[task_name] = func
+        func.task_name = task_name
+        func.max_attempts = max_attempts
+        func.enqueue = lambda run_at=None, **payload: enqueue(
+            task_name, payload, run_at=run_at, max_attempts=max_attempts
+        )
+        return func
+
+    return register
+
+
+def get_task(name):
+    """
+    Return the function registered under a task name.
+
+    Raises:
+        KeyError: If no task has that name
+    """
+    return _tasks[name]
+
+
+def enqueue(task_name, payload=None, run_at=None, max_attempts=5):
+    """
+    Queue a job.
+
+    The job is a plain row written on the current connection, so inside a
+    transaction it is only picked up if the transaction commits.
+
+    Returns:
+        Job: The queued job
+    """
+    job = Job(task=task_name, payload=payload or {}, max_attempts=max_attempts)
+    if run_at is not None:
+        job.run_at = run_at
+    job.save()
+    return job
@@ -0,0 +1,124 @@
+import threading
+import time
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from .models import Job
+from .registry import task
+from .worker import claim, perform
+
+calls = []
+
+
+@task(name="jobs.tests.succeed")
+def succeed(n):
+    calls.append(n)
+
+
+@task(name="jobs.tests.fail", max_attempts=2)
+def fail():
+    calls.append("fail")
+    raise RuntimeError("boom")
+
+
+@task(name="jobs.tests.slow")
+def slow(seconds):
+    time.sleep(seconds)
+    # Still held by this run, so no other worker may take it
+    calls.append(claim())
+
+
+@override_settings(JOBS_RETRY_BACKOFF=30, JOBS_MAX_BACKOFF=3600, JOBS_LOCK_TIMEOUT=600)
+class WorkerTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_successful_job_is_done(self):
+        job = succeed.enqueue(n=1)
+        self.assertTrue(perform(claim()))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.locked_at), (Job.DONE, 1, None))
+        self.assertEqual(calls, [1])
+        self.assertIsNone(claim())
+
+    def test_failed_job_is_retried_with_backoff_then_dead_lettered(self):
+        job = fail.enqueue()
+        start = timezone.now()
+        self.assertFalse(perform(claim(start)))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertIn("RuntimeError: boom", job.last_error)
+        self.assertGreaterEqual(job.run_at, start + timedelta(seconds=30))
+
+        # Not due before the backoff has passed
+        self.assertIsNone(claim(start + timedelta(seconds=10)))
+        self.assertFalse(perform(claim(job.run_at)))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.DEAD, 2))
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(calls, ["fail", "fail"])
+        self.assertIsNone(claim(job.run_at + timedelta(days=1)))
+
+    def test_abandoned_job_is_claimed_again(self):
+        job = succeed.enqueue(n=1)
+        claimed = claim()
+        self.assertIsNone(claim())
+
+        later = claimed.locked_at + timedelta(seconds=601)
+        reclaimed = claim(later)
+        self.assertEqual((reclaimed.pk, reclaimed.attempts), (job.pk, 2))
+
+        # The first worker finishing late does not overwrite the new run
+        self.assertFalse(perform(claimed))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_at), (Job.RUNNING, later))
+        self.assertTrue(perform(reclaimed))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
+
+    def test_abandoned_job_out_of_attempts_is_dead_lettered(self):
+        job = fail.enqueue()
+        claim()
+        job.refresh_from_db()
+        job.attempts = job.max_attempts
+        job.save()
+
+        self.assertIsNone(claim(job.locked_at + timedelta(seconds=601)))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DEAD)
+        self.assertIn("stopped reporting", job.last_error)
+        self.assertEqual(calls, [])
+
+
+class ConcurrentWorkerTests(TransactionTestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_claim_skips_jobs_locked_by_another_worker(self):
+        first = succeed.enqueue(n=1)
+        second = succeed.enqueue(n=2)
+        claimed = []
+
+        def other_worker():
+            try:
+                claimed.append(claim())
+            finally:
+                connection.close()
+
+        with transaction.atomic():
+            Job.objects.select_for_update().get(pk=first.pk)
+            thread = threading.Thread(target=other_worker)
+            thread.start()
+            thread.join()
+        self.assertEqual(claimed[0].pk, second.pk)
+
+    @override_settings(JOBS_LOCK_TIMEOUT=0.4)
+    def test_heartbeat_keeps_long_job_from_being_reclaimed(self):
+        job = slow.enqueue(seconds=1)
+        self.assertTrue(perform(claim()))
+        self.assertEqual(calls, [None])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.DONE, 1))
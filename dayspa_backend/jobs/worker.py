@@ -0,0 +1,199 @@
+import logging
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from .models import Job
+from .registry import get_task
+
+logger = logging.getLogger("jobs.worker")
+
+
+def retry_delay(attempts):
+    """
+    Exponential backoff before the next run of a job that failed
+    ``attempts`` times.
+    """
+    base = getattr(settings, "JOBS_RETRY_BACKOFF", 30)
+    cap = getattr(settings, "JOBS_MAX_BACKOFF", 3600)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), cap))
+
+
+def lock_timeout():
+    return timedelta(seconds=getattr(settings, "JOBS_LOCK_TIMEOUT", 600))
+
+
+def claim(current_time=None):
+    """
+    Take the next due job and mark it running, or return None.
+
+    Concurrent workers skip rows another worker has locked instead of
+    waiting on them, so each job is claimed once. A job whose worker
+    stopped reporting on its last attempt is dead-lettered, not run again.
+    """
+    current_time = current_time or timezone.now()
+    with transaction.atomic():
+        while True:
+            job = (
+                Job.objects.ready(current_time, lock_timeout())
+                .select_for_update(skip_locked=True)
+                .order_by("run_at", "pk")
+                .first()
+            )
+            if job is None:
+                return None
+            if job.status == Job.RUNNING and job.attempts >= job.max_attempts:
+                job.status = Job.DEAD
+                job.locked_at = None
+                job.finished_at = current_time
+                job.last_error = "Worker stopped reporting during the last attempt"
+                job.save(
+                    update_fields=["status", "locked_at", "finished_at", "last_error"]
+                )
+                logger.error(f"Job {job} is out of attempts: {job.last_error}")
+                continue
+            job.status = Job.RUNNING
+            job.locked_at = current_time
+            job.attempts += 1
+            job.save(update_fields=["status", "locked_at", "attempts"])
+            return job
+
+
+class Heartbeat:
+    """
+    Refreshes a running job's ``locked_at`` from a background thread, so a
+    job that runs longer than JOBS_LOCK_TIMEOUT is not taken for abandoned
+    and run a second time.
+    """
+
+    def __init__(self, job, interval):
+        self.job = job
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name=f"jobs-heartbeat-{job.pk}", daemon=True
+        )
+
+    def _run(self):
+        try:
+            while not self._stop.wait(self.interval):
+                now = timezone.now()
+                refreshed = Job.objects.filter(
+                    pk=self.job.pk, status=Job.RUNNING, locked_at=self.job.locked_at
+                ).update(locked_at=now)
+                if not refreshed:
+                    # Another worker took the job over
+                    return
+                self.job.locked_at = now
+        finally:
+            connection.close()
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+
+def perform(job):
+    """
+    Run a claimed job and record the outcome: done, queued again after a
+    backoff, or dead once it is out of attempts.
+
+    The outcome is only written while this worker still holds the job; if
+    it was taken over meanwhile, the other run's result is kept.
+
+    Returns:
+        bool: Whether the job ran successfully
+    """
+    with Heartbeat(job, lock_timeout().total_seconds() / 4):
+        try:
+            get_task(job.task)(**job.payload)
+            error = None
+        except Exception:
+            error = traceback.format_exc()
+
+    now = timezone.now()
+    if error is None:
+        outcome = {"status": Job.DONE, "finished_at": now}
+    elif job.attempts >= job.max_attempts:
+        outcome = {"status": Job.DEAD, "finished_at": now, "last_error": error}
+    else:
+        outcome = {
+            "status": Job.QUEUED,
+            "run_at": now + retry_delay(job.attempts),
+            "last_error": error,
+        }
+
+    # Heartbeats have stopped, so locked_at is the lock this worker holds
+    held = Job.objects.filter(pk=job.pk, status=Job.RUNNING, locked_at=job.locked_at)
+    if not held.update(locked_at=None, **outcome):
+        logger.warning(f"Job {job} was taken over by another worker, dropping result")
+        return False
+
+    for field, value in outcome.items():
+        setattr(job, field, value)
+    job.locked_at = None
+    if job.status == Job.DEAD:
+        logger.error(f"Job {job} is out of attempts:\n{error}")
+    elif job.status == Job.QUEUED:
+        logger.warning(f"Job {job} failed, retrying at {job.run_at}")
+    return error is None
+
+
+def work(stop, poll_interval=1, burst=False):
+    """
+    Claim and run jobs until ``stop`` is set, sleeping ``poll_interval``
+    seconds whenever the queue is empty. With ``burst`` it returns as soon
+    as no job is due.
+
+    Returns:
+        int: Number of jobs run
+    """
+    performed = 0
+    try:
+        while not stop.is_set():
+            close_old_connections()
+            job = claim()
+            if job is None:
+                if burst:
+                    break
+                stop.wait(poll_interval)
+                continue
+            perform(job)
+            performed += 1
+    finally:
+        connection.close()
+    return performed
+
+
+def run_workers(concurrency=1, poll_interval=1, burst=False, stop=None):
+    """
+    Run ``concurrency`` workers in threads, each with its own database
+    connection, until ``stop`` is set (or the queue is drained in burst
+    mode).
+
+    Returns:
+        int: Number of jobs run
+    """
+    stop = stop or threading.Event()
+    counts = [0] * concurrency
+
+    def target(index):
+        counts[index] = work(stop, poll_interval, burst)
+
+    threads = [
+        threading.Thread(target=target, args=(index,), name=f"jobs-worker-{index}")
+        for index in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(counts)
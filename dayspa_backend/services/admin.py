@@ -1,6 +1,10 @@
-from django.contrib import admin
-from .models import Coupon, Service, StaffService
+from datetime import timedelta
+
+from django.contrib import admin, messages
+from .models import Coupon, Service, ShiftTemplate, StaffService
+from .utils import generate_roster
 from unfold.admin import ModelAdmin
+from django.utils import timezone
 from django.utils.html import format_html
 
 
@@ -31,6 +35,12 @@ class ServiceAdmin(ModelAdmin):
     list_filter = ("coupon", "price")
     search_fields = ("service_name", "description")
 
+    def get_search_results(self, request, queryset, search_term):
+        # Full-text match on the indexed search vector instead of icontains
+        if not search_term:
+            return queryset, False
+        return queryset.search(search_term), False
+
     def image_preview(self, obj):
         if obj.service_image:
             return format_html(
@@ -54,3 +64,39 @@ class StaffServiceAdmin(ModelAdmin):
         "status",
     )
     list_filter = ("is_primary", "status")
+
+
+@admin.register(ShiftTemplate)
+class ShiftTemplateAdmin(ModelAdmin):
+    list_display = (
+        "id",
+        "staff",
+        "service",
+        "weekday",
+        "start_time",
+        "end_time",
+        "is_primary",
+        "status",
+        "is_active",
+    )
+    list_filter = ("weekday", "status", "is_active", "is_primary")
+    search_fields = ("staff__email", "service__service_name")
+    actions = ["generate_four_weeks", "generate_thirteen_weeks"]
+
+    def _generate(self, request, queryset, weeks):
+        today = timezone.localdate()
+        start = today + timedelta(days=7 - today.weekday())
+        created, skipped = generate_roster(queryset, start, weeks)
+        self.message_user(
+            request,
+            f"Created {created} shifts from {start} ({skipped} skipped as conflicts).",
+            messages.SUCCESS,
+        )
+
+    @admin.action(description="Generate shifts for the next 4 weeks")
+    def generate_four_weeks(self, request, queryset):
+        self._generate(request, queryset, 4)
+
+    @admin.action(description="Generate shifts for the next 13 weeks")
+    def generate_thirteen_weeks(self, request, queryset):
+        self._generate(request, queryset, 13)
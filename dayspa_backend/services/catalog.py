@@ -0,0 +1,70 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+
+# The catalog version lives in a single database row rather than the cache,
+# so every process sees a bump as soon as the change is committed
+CATALOG_VERSION_PK = 1
+
+
+def catalog_version():
+    """
+    Return the current catalog version, bumped whenever services or coupons
+    change.
+    """
+    from .models import CatalogVersion
+
+    return (
+        CatalogVersion.objects.filter(pk=CATALOG_VERSION_PK)
+        .values_list("version", flat=True)
+        .first()
+        or 0
+    )
+
+
+def bump_catalog_version():
+    from .models import CatalogVersion
+
+    bumped = CatalogVersion.objects.filter(pk=CATALOG_VERSION_PK).update(
+        version=F("version") + 1
+    )
+    if not bumped:
+        CatalogVersion.objects.get_or_create(pk=CATALOG_VERSION_PK)
+
+
+def catalog_etag(request):
+    """
+    Strong ETag of a catalog response, derived from the catalog version and
+    the request alone so it can be checked with a single one-row query.
+    """
+    digest = hashlib.sha256(
+        "|".join(
+            [
+                str(catalog_version()),
+                request.accepted_renderer.format,
+                request.build_absolute_uri(),
+            ]
+        ).encode()
+    ).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def _response_key(etag):
+    return "services:catalog:response:" + etag.strip('"')
+
+
+def get_cached_response(etag):
+    """
+    Return the response data cached under an ETag, or None.
+    """
+    return cache.get(_response_key(etag))
+
+
+def cache_response(etag, data):
+    cache.set(
+        _response_key(etag),
+        data,
+        timeout=getattr(settings, "CATALOG_CACHE_TIMEOUT", 300),
+    )
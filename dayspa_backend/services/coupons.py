@@ -0,0 +1,113 @@
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Coupon
+
+
+class CouponCache:
+    """
+    Process-local cache of coupons keyed by coupon code.
+
+    An entry expires after ``ttl`` seconds or when the coupon's validity
+    window ends, whichever comes first. Unknown codes and coupons whose
+    window has already ended are cached for ``negative_ttl`` seconds.
+    Entries are dropped when a coupon is saved or deleted in this process;
+    other processes pick changes up once their entries expire.
+    """
+
+    def __init__(self, ttl=60, negative_ttl=30):
+        self.ttl = timedelta(seconds=ttl)
+        self.negative_ttl = timedelta(seconds=negative_ttl)
+        self._entries = {}  # code -> (expires at, coupon or None)
+        self._lock = threading.Lock()
+
+    def _expiry(self, coupon, current_time):
+        # Unknown and already expired codes are both cached as negatives;
+        # is_valid() rejects an expired coupon whenever it is served
+        if coupon is None or coupon.valid_until < current_time:
+            return current_time + self.negative_ttl
+        return min(current_time + self.ttl, coupon.valid_until)
+
+    def get(self, coupon_code, current_time=None):
+        """
+        Return the coupon with the given code, or None if there is none.
+        """
+        current_time = current_time or timezone.now()
+        with self._lock:
+            entry = self._entries.get(coupon_code)
+        if entry is not None and entry[0] > current_time:
+            return entry[1]
+
+        coupon = Coupon.objects.filter(coupon_code=coupon_code).first()
+        with self._lock:
+            self._entries[coupon_code] = (self._expiry(coupon, current_time), coupon)
+        return coupon
+
+    def get_many(self, coupon_codes, current_time=None):
+        """
+        Return {code: coupon or None} for several codes, loading all cache
+        misses with a single query.
+        """
+        current_time = current_time or timezone.now()
+        found = {}
+        with self._lock:
+            for code in coupon_codes:
+                entry = self._entries.get(code)
+                if entry is not None and entry[0] > current_time:
+                    found[code] = entry[1]
+
+        missing = set(coupon_codes) - set(found)
+        if missing:
+            loaded = Coupon.objects.in_bulk(missing, field_name="coupon_code")
+            with self._lock:
+                for code in missing:
+                    coupon = loaded.get(code)
+                    self._entries[code] = (self._expiry(coupon, current_time), coupon)
+                    found[code] = coupon
+        return found
+
+    def is_valid(self, coupon, current_time=None):
+        current_time = current_time or timezone.now()
+        return coupon is not None and (
+            coupon.valid_from <= current_time <= coupon.valid_until
+        )
+
+    def get_valid(self, coupon_code, current_time=None):
+        """
+        Return the coupon with the given code if it is valid right now.
+
+        Raises:
+            Coupon.DoesNotExist: If the code is unknown or outside its
+                validity window
+        """
+        current_time = current_time or timezone.now()
+        coupon = self.get(coupon_code, current_time)
+        if not self.is_valid(coupon, current_time):
+            raise Coupon.DoesNotExist(f"No valid coupon with code {coupon_code!r}")
+        return coupon
+
+    def invalidate(self, coupon):
+        """
+        Drop the cached entries of a coupon, including those under a
+        previous code.
+        """
+        with self._lock:
+            self._entries = {
+                code: entry
+                for code, entry in self._entries.items()
+                if code != coupon.coupon_code
+                and (entry[1] is None or entry[1].pk != coupon.pk)
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+coupon_cache = CouponCache(
+    ttl=getattr(settings, "COUPON_CACHE_TTL", 60),
+    negative_ttl=getattr(settings, "COUPON_CACHE_NEGATIVE_TTL", 30),
+)
@@ -0,0 +1,45 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from services.models import ShiftTemplate
+from services.utils import generate_roster
+
+
+class Command(BaseCommand):
+    help = "Generate StaffService rows from the active weekly shift templates"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--start",
+            type=date.fromisoformat,
+            help="First day of the roster (default: next Monday)",
+        )
+        parser.add_argument(
+            "--weeks", type=int, default=4, help="Number of weeks to generate"
+        )
+        parser.add_argument(
+            "--staff",
+            type=int,
+            nargs="*",
+            help="Only generate shifts for these staff IDs",
+        )
+
+    def handle(self, *args, **options):
+        start = options["start"]
+        if start is None:
+            today = timezone.localdate()
+            start = today + timedelta(days=7 - today.weekday())
+
+        templates = ShiftTemplate.objects.filter(is_active=True)
+        if options["staff"]:
+            templates = templates.filter(staff_id__in=options["staff"])
+
+        created, skipped = generate_roster(templates, start, options["weeks"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {created} shifts from {start} for {options['weeks']} weeks "
+                f"({skipped} skipped as conflicts)"
+            )
+        )
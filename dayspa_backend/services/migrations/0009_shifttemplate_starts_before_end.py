@@ -0,0 +1,23 @@
+# Generated by Django 5.1.3 on 2026-10-17 14:25
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("services", "0008_catalogversion"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name="shifttemplate",
+            constraint=models.CheckConstraint(
+                condition=models.Q(("start_time__lt", models.F("end_time"))),
+                name="shift_template_starts_before_end",
+                violation_error_message="The shift must end after it starts.",
+            ),
+        ),
+    ]
@@ -1,9 +1,16 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
-from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.db.models import F, Q
 from django.conf import settings  # Add this for User model reference
 from django.utils import timezone
 from accounts.models import User
 
+from .catalog import bump_catalog_version
+
 
 class Coupon(models.Model):
     coupon_code = models.CharField(max_length=50, unique=True)
@@ -26,12 +33,33 @@ class Coupon(models.Model):
 
         super().save(*args, **kwargs)
 
+        from .coupons import coupon_cache
+
+        coupon_cache.invalidate(self)
+
     def is_valid(self):
         # Use timezone-aware current time
         now = timezone.now()
         return self.valid_from <= now <= self.valid_until
 
 
+# Text search configuration used for the service catalog
+SEARCH_CONFIG = "english"
+
+
+class ServiceQuerySet(models.QuerySet):
+    def search(self, text):
+        """
+        Filter to services matching a web-search style query, best first.
+        """
+        query = SearchQuery(text, search_type="websearch", config=SEARCH_CONFIG)
+        return (
+            self.filter(search_vector=query)
+            .annotate(rank=SearchRank(F("search_vector"), query))
+            .order_by("-rank", "pk")
+        )
+
+
 class Service(models.Model):
     service_name = models.CharField(max_length=255)
     description = models.TextField()
@@ -43,6 +71,19 @@ class Service(models.Model):
     service_image = models.ImageField(upload_to="services/", blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Maintained by Postgres on every write, indexed for full-text search
+    search_vector = models.GeneratedField(
+        expression=SearchVector("service_name", weight="A", config=SEARCH_CONFIG)
+        + SearchVector("description", weight="B", config=SEARCH_CONFIG),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
+    objects = ServiceQuerySet.as_manager()
+
+    class Meta:
+        indexes = [GinIndex(fields=["search_vector"], name="service_search_idx")]
+
     # applied_coupon_code = models.CharField(
     #     max_length=50,
     #     null=True,
@@ -96,3 +137,81 @@ class StaffService(models.Model):
             f"from {self.start_time} to {self.end_time} "
             f"[{'Primary' if self.is_primary else 'Not Primary'}] [{self.get_status_display()}]"
         )
+
+
+class ShiftTemplate(models.Model):
+    """
+    A recurring weekly shift used to generate ``StaffService`` rows in bulk.
+    """
+
+    WEEKDAY_CHOICES = [
+        (0, "Monday"),
+        (1, "Tuesday"),
+        (2, "Wednesday"),
+        (3, "Thursday"),
+        (4, "Friday"),
+        (5, "Saturday"),
+        (6, "Sunday"),
+    ]
+    staff = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        limit_choices_to=~Q(user_role__role_name="Customer"),
+        related_name="shift_templates",
+    )
+    service = models.ForeignKey(Service, on_delete=models.CASCADE)
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAY_CHOICES)
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    is_primary = models.BooleanField(default=False)
+    status = models.CharField(
+        max_length=20, choices=StaffService.STATUS_CHOICES, default="working"
+    )
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("staff", "service", "weekday", "start_time", "end_time")
+        ordering = ["staff", "weekday", "start_time"]
+        constraints = [
+            # Shifts never span midnight, so generated shifts are never empty
+            models.CheckConstraint(
+                condition=Q(start_time__lt=F("end_time")),
+                name="shift_template_starts_before_end",
+                violation_error_message="The shift must end after it starts.",
+            ),
+        ]
+
+    def __str__(self):
+        return (
+            f"{self.staff} - {self.service} every {self.get_weekday_display()} "
+            f"from {self.start_time} to {self.end_time}"
+        )
+
+
+class CatalogVersion(models.Model):
+    """
+    Counter of service and coupon changes, shared by every process and used
+    to key catalog responses and their ETags.
+    """
+
+    version = models.PositiveBigIntegerField(default=1)
+
+    def __str__(self):
+        return f"Catalog version {self.version}"
+
+
+@receiver(post_delete, sender=Coupon)
+def forget_cached_coupon(sender, instance, **kwargs):
+    from .coupons import coupon_cache
+
+    coupon_cache.invalidate(instance)
+
+
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+@receiver(post_save, sender=Coupon)
+@receiver(post_delete, sender=Coupon)
+def bump_catalog_on_change(sender, **kwargs):
+    bump_catalog_version()
@@ -0,0 +1,128 @@
+from django.db.models import Count, F, Q, Window
+
+# (key, lower bound inclusive, upper bound exclusive or None)
+PRICE_BUCKETS = [
+    ("0-50", 0, 50),
+    ("50-100", 50, 100),
+    ("100-200", 100, 200),
+    ("200+", 200, None),
+]
+DURATION_BUCKETS = [
+    ("0-30", 0, 30),
+    ("30-60", 30, 60),
+    ("60-90", 60, 90),
+    ("90+", 90, None),
+]
+
+FACETS = {"price": PRICE_BUCKETS, "duration": DURATION_BUCKETS}
+
+FACET_PREFIX = "facet__"
+MATCHES = FACET_PREFIX + "matches"
+
+
+def bucket_filter(field, key):
+    """
+    Return the Q matching the bucket ``key`` of a facet, or an empty Q for
+    no bucket.
+    """
+    if not key:
+        return Q()
+    for name, low, high in FACETS[field]:
+        if name == key:
+            q = Q(**{f"{field}__gte": low})
+            if high is not None:
+                q &= Q(**{f"{field}__lt": high})
+            return q
+    raise ValueError(f"Unknown {field} bucket: {key}")
+
+
+def _selection(price, duration):
+    return {
+        "price": bucket_filter("price", price),
+        "duration": bucket_filter("duration", duration),
+    }
+
+
+def _facet_counts(selected):
+    """
+    Conditional counts for every facet bucket. Each facet is counted with the
+    other facets' selections applied but not its own, so picking a price
+    range still shows how many services the other ranges would give.
+
+    There is no separate count for the total: it equals the selected bucket's
+    count (and Django would fold the identical expressions into one column).
+    """
+    counts = {}
+    for field, buckets in FACETS.items():
+        others = Q()
+        for other, q in selected.items():
+            if other != field:
+                others &= q
+        for key, _low, _high in buckets:
+            counts[_alias(field, key)] = Count(
+                "pk", filter=bucket_filter(field, key) & others
+            )
+    matched = Q()
+    for q in selected.values():
+        matched &= q
+    return counts, matched
+
+
+def _alias(field, key):
+    # Bucket keys are not valid SQL aliases, their positions are
+    keys = [name for name, _low, _high in FACETS[field]]
+    return f"{FACET_PREFIX}{field}_{keys.index(key)}"
+
+
+def faceted(queryset, price=None, duration=None):
+    """
+    Narrow a service queryset to the selected price and duration buckets and
+    annotate every row with the facet counts, all in one query.
+
+    The counts are window aggregates over the unfiltered queryset, so the
+    bucket selection is applied on top of them (Django wraps the query) and
+    does not shrink the facets. Read them back with pop_facets().
+    """
+    counts, matched = _facet_counts(_selection(price, duration))
+    return queryset.annotate(
+        **{name: Window(count) for name, count in counts.items()},
+        # Per-row window so the selection is filtered after the counts
+        **{MATCHES: Window(Count("pk", filter=matched or None), partition_by=F("pk"))},
+    ).filter(**{MATCHES: 1})
+
+
+def pop_facets(rows, price=None, duration=None):
+    """
+    Strip the facet annotations from rows returned by faceted() and return
+    them as ``{"total": n, "price": {...}, "duration": {...}}``.
+    """
+    values = {}
+    for row in rows:
+        values = {
+            name: row.pop(name) for name in list(row) if name.startswith(FACET_PREFIX)
+        }
+    return _facets_from(values, price, duration)
+
+
+def count_facets(queryset, price=None, duration=None):
+    """
+    Facet counts on their own, for when faceted() returned no rows to carry
+    them.
+    """
+    counts, _matched = _facet_counts(_selection(price, duration))
+    return _facets_from(queryset.order_by().aggregate(**counts), price, duration)
+
+
+def _facets_from(values, price, duration):
+    facets = {
+        field: {key: values.get(_alias(field, key), 0) for key, _low, _high in buckets}
+        for field, buckets in FACETS.items()
+    }
+    if price:
+        total = facets["price"][price]
+    elif duration:
+        total = facets["duration"][duration]
+    else:
+        # The price buckets cover every price
+        total = sum(facets["price"].values())
+    return {"total": total, **facets}
@@ -1,3 +1,50 @@
+from datetime import time as clock
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from accounts.models import User
+from services.coupons import CouponCache
+from services.models import Coupon, Service, ShiftTemplate
+
+
+class ShiftTemplateTests(TestCase):
+    def test_shift_must_end_after_it_starts(self):
+        template = ShiftTemplate(
+            staff=User.objects.create_user(email="staff@example.com", password="x"),
+            service=Service.objects.create(
+                service_name="Massage",
+                description="Test service",
+                duration=60,
+                price=Decimal("50.00"),
+            ),
+            weekday=0,
+            start_time=clock(17),
+            end_time=clock(9),
+        )
+        with self.assertRaises(ValidationError):
+            template.full_clean()
+        with self.assertRaises(IntegrityError):
+            template.save()
+
 
-# Create your tests here.
+class CouponCacheTests(TestCase):
+    def test_expired_coupon_is_cached_and_rejected(self):
+        now = timezone.now()
+        Coupon.objects.create(
+            coupon_code="ENDED",
+            discount=Decimal("10"),
+            valid_from=now - timedelta(days=7),
+            valid_until=now - timedelta(days=1),
+        )
+        coupons = CouponCache(ttl=60, negative_ttl=30)
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(3):
+                with self.assertRaises(Coupon.DoesNotExist):
+                    coupons.get_valid("ENDED", now)
+        self.assertEqual(len(queries), 1)
@@ -0,0 +1,79 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+
+from .models import StaffService
+
+
+def generate_roster(templates, start_date, weeks):
+    """
+    Materialize weekly shift templates into ``StaffService`` rows.
+
+    Existing rows for the affected staff are loaded with one query and
+    checked in memory; a generated row is skipped when the same staff member
+    already has an overlapping shift for the same service on that day. The
+    remaining rows are inserted with ``bulk_create``.
+
+    Args:
+        templates (iterable): ShiftTemplate objects to apply
+        start_date (date): First day of the roster
+        weeks (int): Number of weeks to generate
+
+    Returns:
+        tuple: (number of rows created, number of rows skipped as conflicts)
+    """
+    from bookings.models import StaffAvailability
+
+    templates = [template for template in templates if template.is_active]
+    if not templates or weeks < 1:
+        return 0, 0
+    end_date = start_date + timedelta(weeks=weeks, days=-1)
+
+    # (staff id, service id, date) -> list of (start time, end time)
+    taken = defaultdict(list)
+    existing = StaffService.objects.filter(
+        staff_id__in={template.staff_id for template in templates},
+        date__range=(start_date, end_date),
+    ).values_list("staff_id", "service_id", "date", "start_time", "end_time")
+    for staff_id, service_id, day, start_time, end_time in existing:
+        taken[(staff_id, service_id, day)].append((start_time, end_time))
+
+    by_weekday = defaultdict(list)
+    for template in templates:
+        by_weekday[template.weekday].append(template)
+
+    rows = []
+    skipped = 0
+    day = start_date
+    while day <= end_date:
+        for template in by_weekday[day.weekday()]:
+            key = (template.staff_id, template.service_id, day)
+            if any(
+                start_time is None
+                or end_time is None
+                or (start_time < template.end_time and template.start_time < end_time)
+                for start_time, end_time in taken[key]
+            ):
+                skipped += 1
+                continue
+            taken[key].append((template.start_time, template.end_time))
+            rows.append(
+                StaffService(
+                    staff_id=template.staff_id,
+                    service_id=template.service_id,
+                    is_primary=template.is_primary,
+                    date=day,
+                    start_time=template.start_time,
+                    end_time=template.end_time,
+                    status=template.status,
+                )
+            )
+        day += timedelta(days=1)
+
+    with transaction.atomic():
+        StaffService.objects.bulk_create(rows, batch_size=1000)
+        # bulk_create skips the signals that keep the bitmaps current
+        StaffAvailability.objects.refresh((row.staff_id, row.date) for row in rows)
+
+    return len(rows), skipped
@@ -1,6 +1,9 @@
 import { useBaseURL } from "~/service/baseURL";
 
-export const fetchAppointments = async (token?: string | null) => {
+export const fetchAppointments = async (
+  token?: string | null,
+  filters: AppointmentListFilters = {},
+) => {
   try {
     const baseUrl = useBaseURL();
     // Construct URL without userId
@@ -15,17 +18,26 @@ export const fetchAppointments = async (token?: string | null) => {
         }
       : {};
 
+    // Only send the filters that are set; the cursor selects the page
+    const query = Object.fromEntries(
+      Object.entries(filters).filter(([, value]) => value),
+    );
+
     // Pass the options as the second argument to useFetch
-    const { data } = await useFetch<MultipleAppointmentResponse>(url, options);
+    const { data } = await useFetch<MultipleAppointmentResponse>(url, {
+      ...options,
+      query,
+    });
 
     if (data.value) {
       return {
-        appointments: data.value.data,
-        count: data.value.data.length,
+        appointments: data.value.data.results,
+        nextCursor: data.value.data.next_cursor,
+        count: data.value.data.results.length,
       };
     }
 
-    return { appointments: [], count: 0 };
+    return { appointments: [], nextCursor: null, count: 0 };
   } catch (error) {
     console.error("Error fetching appointments:", error);
     throw new Error("Unable to fetch appointments");
@@ -32,3 +32,19 @@ export const fetchServiceById = async (id: string) => {
   return null;
 };
 
+
+export const searchServices = async (filters: ServiceSearchFilters) => {
+  const baseURL = useBaseURL();
+  const { data } = await useFetch<ServiceSearchResponse>(
+    `${baseURL}api/service/search/`,
+    {
+      params: Object.fromEntries(
+        Object.entries(filters).filter(([, value]) => value !== undefined),
+      ),
+    },
+  );
+  if (data.value) {
+    return data.value.data;
+  }
+  return { count: 0, facets: { price: {}, duration: {} }, results: [] };
+};
@@ -81,16 +81,20 @@ export const requestPasswordReset = async (email: string) => {
   }
 };
 
-// Reset the password using the token from the email
-export const resetPassword = async (token: string, password: string) => {
+// Reset the password using the user id and token from the email link
+export const resetPassword = async (
+  uid: string,
+  token: string,
+  password: string,
+) => {
   try {
     const baseUrl = useBaseURL();
     const url = `${baseUrl}api/auth/password_reset_confirm/`;
 
-    // Pass the token and password in the request body
+    // Pass the user id, token and password in the request body
     const { data: response } = await useFetch(url, {
       method: "POST",
-      body: JSON.stringify({ password, token }), // Include both password and token
+      body: JSON.stringify({ password, uid, token }), // Include the user id, token and password
       headers: {
         "Content-Type": "application/json",
       },
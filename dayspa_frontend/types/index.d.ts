@@ -2,9 +2,13 @@ export {
   Service,
   ServiceResponse,
   ServiceResponseDetail,
+  ServiceSearchFilters,
+  ServiceSearchResponse,
   Appointment,
   SingleAppointmentResponse,
   MultipleAppointmentResponse,
+  AppointmentPage,
+  AppointmentListFilters,
   AppointmentResponseBase,
   AppointmentResponse,
   AppointmentCreateRequest,
@@ -82,8 +86,21 @@ declare global {
     data: Appointment; // Single Appointment object
   }
 
+  interface AppointmentPage {
+    results: Appointment[]; // Appointments on this page
+    next: string | null; // URL of the next page
+    next_cursor: string | null; // Cursor of the next page, null on the last page
+  }
+
+  interface AppointmentListFilters {
+    when?: "all" | "upcoming" | "past";
+    status?: string;
+    cursor?: string | null;
+    page_size?: number;
+  }
+
   interface MultipleAppointmentResponse extends AppointmentResponseBase {
-    data: Appointment[]; // Array of Appointment objects
+    data: AppointmentPage; // One page of Appointment objects
   }
 
   type AppointmentResponse =
@@ -101,4 +118,26 @@ declare global {
     data: Service; 
     status_code: number; 
   }
+
+  interface ServiceSearchFilters {
+    q?: string; // Search terms
+    price?: "0-50" | "50-100" | "100-200" | "200+";
+    duration?: "0-30" | "30-60" | "60-90" | "90+"; // Minutes
+    limit?: number;
+    offset?: number;
+  }
+
+  interface ServiceSearchResponse {
+    success: boolean;
+    message: string;
+    data: {
+      count: number; // Matches across all pages
+      facets: {
+        price: Record<string, number>; // Matches per price range
+        duration: Record<string, number>; // Matches per duration range
+      };
+      results: Service[];
+    };
+    status_code: number;
+  }
 }